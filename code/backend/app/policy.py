@@ -0,0 +1,149 @@
+"""
+Precomputed per-scenario value tables for the recommender.
+
+`code/model/solve_policy.py` runs backward induction over a grid of (t, zone storages, budget) and writes
+one `code/data/policies/<scenario_id>.npz` per scenario. The backend answers a recommendation with a
+one-step lookahead against the multilinearly interpolated value of the next state, and falls back to
+the Monte Carlo recommender for states outside the grid or tables solved for other scenario data.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+POLICY_VERSION = 1
+
+
+def scenario_fingerprint(spec: Dict[str, Any], rain: Sequence[float]) -> str:
+    """Hash of the scenario parameters and rain series a table was solved for."""
+    payload = json.dumps({"spec": spec, "rain": [float(r) for r in rain]}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def multilinear(values: np.ndarray, axes: Sequence[np.ndarray], points: np.ndarray) -> np.ndarray:
+    """
+    Multilinear interpolation of `values` on the rectilinear grid `axes` (one ascending array per axis
+    of `values`) at `points` of shape (..., d). Points outside the grid are clamped to its boundary.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    lo_idx, weights = [], []
+    for d, axis in enumerate(axes):
+        p = np.clip(points[..., d], axis[0], axis[-1])
+        i = np.clip(np.searchsorted(axis, p, side="right") - 1, 0, len(axis) - 2)
+        lo_idx.append(i)
+        weights.append((p - axis[i]) / (axis[i + 1] - axis[i]))
+    out = np.zeros(points.shape[:-1])
+    for corner in range(1 << len(axes)):
+        w = np.ones(points.shape[:-1])
+        idx = []
+        for d in range(len(axes)):
+            upper = (corner >> d) & 1
+            w = w * (weights[d] if upper else 1.0 - weights[d])
+            idx.append(lo_idx[d] + upper)
+        out += w * values[tuple(idx)]
+    return out
+
+
+class PolicyTable:
+    """Value table V[t, storage_0, ..., storage_{Z-1}, budget] for one scenario (V[T] = 0)."""
+
+    def __init__(
+        self,
+        scenario_id: str,
+        zone_ids: Sequence[str],
+        storage_axes: Sequence[np.ndarray],
+        budget_axis: np.ndarray,
+        value: np.ndarray,
+        factors: np.ndarray,
+        alpha: float,
+        fingerprint: str,
+        meta: Optional[Dict[str, Any]] = None,
+    ):
+        self.scenario_id = scenario_id
+        self.zone_ids = tuple(zone_ids)
+        self.storage_axes = [np.asarray(a, dtype=np.float64) for a in storage_axes]
+        self.budget_axis = np.asarray(budget_axis, dtype=np.float64)
+        self.value = np.asarray(value)
+        self.factors = np.asarray(factors, dtype=np.float64)
+        self.alpha = float(alpha)
+        self.fingerprint = fingerprint
+        self.meta = meta or {}
+        expected = (self.value.shape[0],) + tuple(len(a) for a in self.storage_axes) + (len(self.budget_axis),)
+        if self.value.shape != expected:
+            raise ValueError(f"value table shape {self.value.shape} does not match its axes {expected}")
+        self.axes = self.storage_axes + [self.budget_axis]
+
+    @property
+    def horizon(self) -> int:
+        """Number of decision steps covered (the rain series length it was solved for)."""
+        return self.value.shape[0] - 1
+
+    def contains(self, t: int, storages: Sequence[float], budget: float) -> bool:
+        """Whether a decision state lies on the table (inside the grid, before the horizon)."""
+        if not 0 <= t < self.horizon:
+            return False
+        inside = all(a[0] <= s <= a[-1] for a, s in zip(self.storage_axes, storages))
+        return inside and self.budget_axis[0] <= budget <= self.budget_axis[-1]
+
+    def value_at(self, t: int, storages: np.ndarray, budgets: np.ndarray) -> np.ndarray:
+        """Interpolated V[t] at storages (..., Z) and budgets (...), broadcast together; clamped to the grid."""
+        storages = np.asarray(storages, dtype=np.float64)
+        budgets = np.asarray(budgets, dtype=np.float64)
+        shape = np.broadcast_shapes(storages.shape[:-1], budgets.shape)
+        points = np.concatenate(
+            [np.broadcast_to(storages, shape + storages.shape[-1:]), np.broadcast_to(budgets, shape)[..., None]],
+            axis=-1,
+        )
+        return multilinear(self.value[min(t, self.horizon)], self.axes, points)
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(
+            path,
+            version=np.array(POLICY_VERSION),
+            scenario_id=np.array(self.scenario_id),
+            zone_ids=np.array(self.zone_ids),
+            storage_axes=np.stack(self.storage_axes),
+            budget_axis=self.budget_axis,
+            value=self.value.astype(np.float32),
+            factors=self.factors,
+            alpha=np.array(self.alpha),
+            fingerprint=np.array(self.fingerprint),
+            meta=np.array(json.dumps(self.meta)),
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> "PolicyTable":
+        """Load a table written by `save`. Raises ValueError for other table versions."""
+        with np.load(path) as data:
+            if int(data["version"]) != POLICY_VERSION:
+                raise ValueError(f"policy table version {int(data['version'])} != {POLICY_VERSION}")
+            return cls(
+                scenario_id=str(data["scenario_id"]),
+                zone_ids=[str(z) for z in data["zone_ids"]],
+                storage_axes=list(data["storage_axes"]),
+                budget_axis=data["budget_axis"],
+                value=data["value"].astype(np.float64),
+                factors=data["factors"],
+                alpha=float(data["alpha"]),
+                fingerprint=str(data["fingerprint"]),
+                meta=json.loads(str(data["meta"])),
+            )
+
+
+def load_policy_tables(policy_dir: Path) -> Tuple[Dict[str, PolicyTable], List[str]]:
+    """All readable tables in `policy_dir` keyed by scenario id, plus one message per unreadable file."""
+    tables: Dict[str, PolicyTable] = {}
+    errors: List[str] = []
+    for path in sorted(Path(policy_dir).glob("*.npz")):
+        try:
+            table = PolicyTable.load(path)
+        except (OSError, KeyError, ValueError) as e:
+            errors.append(f"{path.name}: {e}")
+            continue
+        tables[table.scenario_id] = table
+    return tables, errors
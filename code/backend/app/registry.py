@@ -0,0 +1,121 @@
+"""
+Reloading registry for data loaded from files (the scenario definitions and their rainfall series).
+
+The registry builds an immutable snapshot once and publishes it with a single reference assignment, so
+readers never see a half-loaded state and code holding an older snapshot keeps using it unchanged. Every
+`check_interval` seconds a read stats the files the snapshot was built from and rebuilds it when one
+changed (mtime, size or existence). Recent snapshots stay retrievable by version for sessions created
+before a reload.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Generic, Optional, Sequence, Tuple, TypeVar
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+FileSignature = Optional[Tuple[int, int]]  # (mtime_ns, size), None for a missing file
+UNSEEN: FileSignature = (-1, -1)  # never matches a real file, so the next check reloads
+
+
+def file_signature(path: Path) -> FileSignature:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class SnapshotRegistry(Generic[T]):
+    """
+    `build()` returns (snapshot, version, paths): the snapshot, a version string identifying its contents
+    and the files it was read from. A failed rebuild keeps the previous snapshot and is retried at the
+    next check; the first build raises.
+    """
+
+    def __init__(
+        self,
+        build: Callable[[], Tuple[T, str, Sequence[Path]]],
+        check_interval: float = 1.0,
+        keep: int = 8,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._build = build
+        self.check_interval = check_interval
+        self.keep = keep
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._versions: "OrderedDict[str, T]" = OrderedDict()
+        self.stats = {"reloads": 0, "reload_errors": 0}
+        self._publish(*self._load())
+
+    def current(self) -> T:
+        """The latest snapshot, rebuilt first if its files changed since the last check."""
+        if self.clock() >= self._next_check:
+            self._refresh()
+        return self._snapshot
+
+    @property
+    def version(self) -> str:
+        return self._version
+
+    def get(self, version: str) -> Optional[T]:
+        """A recent snapshot by version (after checking for changes), or None if it is not retained."""
+        self.current()
+        with self._lock:
+            return self._versions.get(version)
+
+    def _load(self, watched: Sequence[Path] = ()) -> Tuple[T, str, Dict[Path, FileSignature]]:
+        """
+        Build a snapshot and the signatures of its files taken *before* reading them, so an edit made during
+        the build shows up as a change at the next check. A build that reads files not stat'ed beforehand
+        is repeated once with them included; if it still finds new ones, they are recorded as UNSEEN.
+        """
+        watched = {Path(p) for p in watched}
+        for _ in range(2):
+            before = {path: file_signature(path) for path in watched}
+            snapshot, version, paths = self._build()
+            paths = {Path(p) for p in paths}
+            if paths <= watched:
+                break
+            watched |= paths
+        return snapshot, version, {path: before.get(path, UNSEEN) for path in paths}
+
+    def _publish(self, snapshot: T, version: str, signatures: Dict[Path, FileSignature]) -> None:
+        with self._lock:
+            self._versions[version] = snapshot
+            self._versions.move_to_end(version)
+            while len(self._versions) > self.keep:
+                self._versions.popitem(last=False)
+        self._signatures = signatures
+        self._version = version
+        self._snapshot = snapshot
+        self._next_check = self.clock() + self.check_interval
+
+    def _changed(self) -> bool:
+        return any(file_signature(path) != sig for path, sig in self._signatures.items())
+
+    def _refresh(self) -> None:
+        with self._lock:
+            if self.clock() < self._next_check:
+                return  # another thread just checked
+            self._next_check = self.clock() + self.check_interval
+            if not self._changed():
+                return
+        before = {path: file_signature(path) for path in self._signatures}
+        try:
+            snapshot, version, signatures = self._load(list(self._signatures))
+        except Exception as e:
+            self.stats["reload_errors"] += 1
+            logger.error(f"Reload failed, keeping version {self._version}: {e}")
+            self._signatures = before  # don't retry until the files change again
+            return
+        self.stats["reloads"] += 1
+        logger.info(f"Reloaded: version {self._version} -> {version}")
+        self._publish(snapshot, version, signatures)
@@ -0,0 +1,479 @@
+"""
+Session stores for game sessions.
+
+- MemorySessionStore:   live objects in this process (single worker)
+- SQLiteSessionStore:   serialized sessions in a SQLite file shared by the workers on one host
+- KeyValueSessionStore: serialized sessions in a Redis-compatible server (or LocalKeyValue in-process)
+
+Sessions expire when idle longer than the TTL and, oldest access first, are evicted when a store exceeds
+its session count or byte budget. Evicted ids are remembered for a while so callers can tell an expired
+session apart from one that never existed. External stores hand out deserialized copies, so callers must
+write a session back after mutating it: `replace` does so only if no other writer got there first, by
+comparing the version (`version_of`) the caller read with the one stored.
+"""
+from __future__ import annotations
+
+import math
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Generic, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# How many evicted session ids are remembered (for "gone" rather than "not found" answers)
+MAX_TOMBSTONES = 10000
+
+# Stats counter -> the reason reported to clients for a session that is gone
+EVICTION_REASONS = {"expired": "expired", "evicted_count": "evicted", "evicted_bytes": "evicted"}
+
+
+class SessionStore(ABC, Generic[T]):
+    """Interface shared by all session stores."""
+
+    @abstractmethod
+    def put(self, session_id: str, session: T) -> None:
+        """Store (or replace) a session and mark it most recently used."""
+
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[T]:
+        """The session (marked most recently used), or None if unknown, expired or evicted."""
+
+    @abstractmethod
+    def replace(self, session_id: str, session: T, version: int) -> bool:
+        """
+        Compare-and-swap: store `session` only if the stored copy is still at `version` (the version the
+        caller read before mutating it). False if another writer stored a newer version, or it is gone.
+        """
+
+    @abstractmethod
+    def eviction_reason(self, session_id: str) -> Optional[str]:
+        """Why a session is no longer stored ("expired" or "evicted"), or None if it was never stored (or is still live)."""
+
+    @abstractmethod
+    def snapshot(self) -> Dict[str, Any]:
+        """Size and counters for monitoring."""
+
+
+class MemorySessionStore(SessionStore[T]):
+    """
+    Thread-safe in-process session map with idle TTL and LRU eviction.
+
+    `ttl` is in seconds (0 disables expiry); `max_sessions` and `max_bytes` cap the store (0 = unlimited).
+    `size_of` estimates a session's footprint in bytes; sizes are re-measured whenever a session is stored
+    or accessed, so they track sessions that grow between requests. Sessions are shared live objects, so
+    callers serialize mutations with a per-session lock; `replace` compares against the version recorded
+    when the session was last stored.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 0.0,
+        max_sessions: int = 0,
+        max_bytes: int = 0,
+        size_of: Callable[[T], int] = lambda _: 0,
+        version_of: Callable[[T], int] = lambda _: 0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.size_of = size_of
+        self.version_of = version_of
+        self.clock = clock
+        # id -> (session, last access, bytes, version when stored)
+        self._entries: "OrderedDict[str, Tuple[T, float, int, int]]" = OrderedDict()
+        self._tombstones: "OrderedDict[str, str]" = OrderedDict()  # evicted id -> reason
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "gone": 0, "expired": 0, "evicted_count": 0, "evicted_bytes": 0}
+
+    def put(self, session_id: str, session: T) -> None:
+        with self._lock:
+            self._store(session_id, session, self.version_of(session))
+            self._evict(keep=session_id)
+
+    def get(self, session_id: str) -> Optional[T]:
+        with self._lock:
+            self._expire()
+            entry = self._entries.get(session_id)
+            if entry is None:
+                self.stats["gone" if session_id in self._tombstones else "misses"] += 1
+                return None
+            self.stats["hits"] += 1
+            self._store(session_id, entry[0], entry[3])
+            self._evict(keep=session_id)
+            return entry[0]
+
+    def replace(self, session_id: str, session: T, version: int) -> bool:
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None or entry[3] != version:
+                return False
+            self._store(session_id, session, self.version_of(session))
+            self._evict(keep=session_id)
+            return True
+
+    def eviction_reason(self, session_id: str) -> Optional[str]:
+        with self._lock:
+            return self._tombstones.get(session_id)
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            return session_id in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            self._expire()
+            return {
+                "backend": "memory",
+                "sessions": len(self._entries),
+                "approx_bytes": self._bytes,
+                "ttl_s": self.ttl,
+                "max_sessions": self.max_sessions,
+                "max_bytes": self.max_bytes,
+                **self.stats,
+            }
+
+    def _store(self, session_id: str, session: T, version: int) -> None:
+        old = self._entries.pop(session_id, None)
+        if old is not None:
+            self._bytes -= old[2]
+        size = int(self.size_of(session))
+        self._entries[session_id] = (session, self.clock(), size, version)
+        self._bytes += size
+        self._tombstones.pop(session_id, None)
+
+    def _drop(self, session_id: str, reason: str) -> None:
+        _, _, size, _ = self._entries.pop(session_id)
+        self._bytes -= size
+        self.stats[reason] += 1
+        self._tombstones[session_id] = EVICTION_REASONS[reason]
+        while len(self._tombstones) > MAX_TOMBSTONES:
+            self._tombstones.popitem(last=False)
+
+    def _expire(self) -> None:
+        # Entries are in access order, so idle sessions sit at the front
+        if self.ttl <= 0:
+            return
+        cutoff = self.clock() - self.ttl
+        while self._entries:
+            session_id, (_, last_access, _, _) = next(iter(self._entries.items()))
+            if last_access > cutoff:
+                break
+            self._drop(session_id, "expired")
+
+    def _evict(self, keep: str) -> None:
+        self._expire()
+        while self.max_sessions > 0 and len(self._entries) > self.max_sessions:
+            victim = next(iter(self._entries))
+            if victim == keep:
+                break
+            self._drop(victim, "evicted_count")
+        while self.max_bytes > 0 and self._bytes > self.max_bytes and len(self._entries) > 1:
+            victim = next(iter(self._entries))
+            if victim == keep:
+                break
+            self._drop(victim, "evicted_bytes")
+
+
+class SQLiteSessionStore(SessionStore[T]):
+    """
+    Serialized sessions in a SQLite database, so every worker process on a host sees the same sessions.
+
+    The database runs in WAL mode (readers never block the writer) with one connection per thread; the
+    statements are fixed parameterized SQL, prepared once per connection by sqlite3's statement cache.
+    TTL and the count / byte caps (byte size = serialized length) are enforced on every write, oldest
+    access first. `replace` is a single conditional UPDATE on the version column. Hit/miss counters are
+    per process.
+    """
+
+    _SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS sessions "
+        "(id TEXT PRIMARY KEY, data BLOB NOT NULL, last_access REAL NOT NULL, version INTEGER NOT NULL DEFAULT 0)",
+        "CREATE INDEX IF NOT EXISTS sessions_last_access ON sessions (last_access)",
+        "CREATE TABLE IF NOT EXISTS tombstones (id TEXT PRIMARY KEY, reason TEXT NOT NULL, at REAL NOT NULL)",
+    )
+
+    def __init__(
+        self,
+        path: str,
+        dumps: Callable[[T], bytes],
+        loads: Callable[[bytes], T],
+        ttl: float = 0.0,
+        max_sessions: int = 0,
+        max_bytes: int = 0,
+        version_of: Callable[[T], int] = lambda _: 0,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.path = path
+        self.dumps = dumps
+        self.loads = loads
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.version_of = version_of
+        self.clock = clock
+        self._local = threading.local()
+        self.stats = {"hits": 0, "misses": 0, "gone": 0, "expired": 0, "evicted_count": 0, "evicted_bytes": 0}
+        conn = self._conn()
+        for statement in self._SCHEMA:
+            conn.execute(statement)
+        if "version" not in {row[1] for row in conn.execute("PRAGMA table_info(sessions)")}:
+            # Databases created before sessions were versioned
+            conn.execute("ALTER TABLE sessions ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def put(self, session_id: str, session: T) -> None:
+        data = self.dumps(session)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO sessions (id, data, last_access, version) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET data = excluded.data, last_access = excluded.last_access, "
+                "version = excluded.version",
+                (session_id, data, self.clock(), self.version_of(session)),
+            )
+            conn.execute("DELETE FROM tombstones WHERE id = ?", (session_id,))
+            self._evict(conn, keep=session_id)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def replace(self, session_id: str, session: T, version: int) -> bool:
+        data = self.dumps(session)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            updated = conn.execute(
+                "UPDATE sessions SET data = ?, last_access = ?, version = ? WHERE id = ? AND version = ?",
+                (data, self.clock(), self.version_of(session), session_id, version),
+            ).rowcount
+            if updated:
+                self._evict(conn, keep=session_id)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return updated == 1
+
+    def get(self, session_id: str) -> Optional[T]:
+        conn = self._conn()
+        now = self.clock()
+        row = conn.execute("SELECT data, last_access FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        if row is not None and self.ttl > 0 and row[1] <= now - self.ttl:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._tombstone(conn, [session_id], "expired")
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            row = None
+        if row is None:
+            self.stats["gone" if self.eviction_reason(session_id) else "misses"] += 1
+            return None
+        conn.execute("UPDATE sessions SET last_access = ? WHERE id = ?", (now, session_id))
+        self.stats["hits"] += 1
+        return self.loads(row[0])
+
+    def eviction_reason(self, session_id: str) -> Optional[str]:
+        row = self._conn().execute("SELECT reason FROM tombstones WHERE id = ?", (session_id,)).fetchone()
+        return row[0] if row is not None else None
+
+    def snapshot(self) -> Dict[str, Any]:
+        count, size = self._conn().execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM sessions").fetchone()
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "sessions": count,
+            "approx_bytes": size,
+            "ttl_s": self.ttl,
+            "max_sessions": self.max_sessions,
+            "max_bytes": self.max_bytes,
+            **self.stats,
+        }
+
+    def _tombstone(self, conn: sqlite3.Connection, ids: List[str], reason: str) -> None:
+        now = self.clock()
+        for session_id in ids:
+            conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            conn.execute("INSERT OR REPLACE INTO tombstones (id, reason, at) VALUES (?, ?, ?)", (session_id, EVICTION_REASONS[reason], now))
+        self.stats[reason] += len(ids)
+
+    def _evict(self, conn: sqlite3.Connection, keep: str) -> None:
+        if self.ttl > 0:
+            cutoff = self.clock() - self.ttl
+            expired = [r[0] for r in conn.execute("SELECT id FROM sessions WHERE last_access <= ? AND id != ?", (cutoff, keep))]
+            self._tombstone(conn, expired, "expired")
+        if self.max_sessions > 0:
+            (count,) = conn.execute("SELECT COUNT(*) FROM sessions").fetchone()
+            if count > self.max_sessions:
+                victims = conn.execute(
+                    "SELECT id FROM sessions WHERE id != ? ORDER BY last_access LIMIT ?", (keep, count - self.max_sessions)
+                ).fetchall()
+                self._tombstone(conn, [r[0] for r in victims], "evicted_count")
+        if self.max_bytes > 0:
+            (size,) = conn.execute("SELECT COALESCE(SUM(LENGTH(data)), 0) FROM sessions").fetchone()
+            victims = []
+            for session_id, length in conn.execute("SELECT id, LENGTH(data) FROM sessions WHERE id != ? ORDER BY last_access", (keep,)):
+                if size <= self.max_bytes:
+                    break
+                victims.append(session_id)
+                size -= length
+            self._tombstone(conn, victims, "evicted_bytes")
+        conn.execute(
+            "DELETE FROM tombstones WHERE id IN (SELECT id FROM tombstones ORDER BY at DESC LIMIT -1 OFFSET ?)",
+            (MAX_TOMBSTONES,),
+        )
+
+
+class LocalKeyValue:
+    """
+    In-process stand-in for the subset of the Redis client API used by KeyValueSessionStore
+    (get / set with `ex` / expire / delete / lock), for development and single-process runs.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self._data: Dict[str, Tuple[bytes, Optional[float]]] = {}
+        self._lock = threading.Lock()
+        self._named_locks: Dict[str, threading.Lock] = {}
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[1] is not None and entry[1] <= self.clock():
+                del self._data[key]
+                return None
+            return entry[0]
+
+    def set(self, key: str, value, ex: Optional[float] = None) -> bool:
+        data = value.encode("utf-8") if isinstance(value, str) else bytes(value)
+        with self._lock:
+            self._data[key] = (data, self.clock() + ex if ex else None)
+        return True
+
+    def expire(self, key: str, seconds: float) -> bool:
+        with self._lock:
+            if key not in self._data:
+                return False
+            self._data[key] = (self._data[key][0], self.clock() + seconds)
+            return True
+
+    def delete(self, *keys: str) -> int:
+        with self._lock:
+            return sum(self._data.pop(key, None) is not None for key in keys)
+
+    def lock(self, name: str, timeout: Optional[float] = None) -> "_LocalLock":
+        """Named lock with the acquire / release interface of redis-py's `Redis.lock` (`timeout` is ignored)."""
+        with self._lock:
+            return _LocalLock(self._named_locks.setdefault(name, threading.Lock()))
+
+
+class _LocalLock:
+    def __init__(self, lock: threading.Lock):
+        self._lock = lock
+
+    def acquire(self, blocking_timeout: Optional[float] = None) -> bool:
+        return self._lock.acquire(timeout=-1 if blocking_timeout is None else blocking_timeout)
+
+    def release(self) -> None:
+        self._lock.release()
+
+
+class KeyValueSessionStore(SessionStore[T]):
+    """
+    Serialized sessions in a Redis-compatible key-value server shared by all workers and instances.
+
+    The idle TTL maps onto key expiry (refreshed on every access). Count and byte caps are left to the
+    server's own eviction policy (e.g. `maxmemory` with `allkeys-lru`), which tracks recency itself. A
+    long-lived marker per session id lets an expired or server-evicted session be reported as gone.
+    `replace` checks a per-session version key while holding a short server-side lock on the session.
+    """
+
+    GONE_TTL = 7 * 24 * 3600
+    LOCK_TIMEOUT = 5.0
+
+    def __init__(
+        self,
+        client,
+        dumps: Callable[[T], bytes],
+        loads: Callable[[bytes], T],
+        ttl: float = 0.0,
+        prefix: str = "flood:",
+        version_of: Callable[[T], int] = lambda _: 0,
+    ):
+        self.client = client
+        self.dumps = dumps
+        self.loads = loads
+        self.ttl = ttl
+        self.prefix = prefix
+        self.version_of = version_of
+        self.stats = {"hits": 0, "misses": 0, "gone": 0}
+
+    def _key(self, session_id: str) -> str:
+        return f"{self.prefix}session:{session_id}"
+
+    def _known_key(self, session_id: str) -> str:
+        return f"{self.prefix}known:{session_id}"
+
+    def _version_key(self, session_id: str) -> str:
+        return f"{self.prefix}version:{session_id}"
+
+    def _ttl_seconds(self) -> Optional[int]:
+        # Redis expiries are whole seconds; round up so a sub-second TTL never becomes 0 (an error / no expiry).
+        return max(1, math.ceil(self.ttl)) if self.ttl > 0 else None
+
+    def put(self, session_id: str, session: T) -> None:
+        self.client.set(self._key(session_id), self.dumps(session), ex=self._ttl_seconds())
+        self.client.set(self._version_key(session_id), str(self.version_of(session)), ex=self.GONE_TTL)
+        self.client.set(self._known_key(session_id), b"1", ex=self.GONE_TTL)
+
+    def replace(self, session_id: str, session: T, version: int) -> bool:
+        lock = self.client.lock(f"{self.prefix}lock:{session_id}", timeout=self.LOCK_TIMEOUT)
+        if not lock.acquire(blocking_timeout=self.LOCK_TIMEOUT):
+            return False
+        try:
+            stored = self.client.get(self._version_key(session_id))
+            if stored is None or int(stored) != version or self.client.get(self._key(session_id)) is None:
+                return False
+            self.put(session_id, session)
+            return True
+        finally:
+            lock.release()
+
+    def get(self, session_id: str) -> Optional[T]:
+        data = self.client.get(self._key(session_id))
+        if data is None:
+            self.stats["gone" if self.eviction_reason(session_id) else "misses"] += 1
+            return None
+        if self.ttl > 0:
+            self.client.expire(self._key(session_id), self._ttl_seconds())
+        self.stats["hits"] += 1
+        return self.loads(data)
+
+    def eviction_reason(self, session_id: str) -> Optional[str]:
+        if self.client.get(self._known_key(session_id)) is None or self.client.get(self._key(session_id)) is not None:
+            return None
+        return "expired"
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"backend": type(self.client).__name__, "ttl_s": self.ttl, **self.stats}
@@ -0,0 +1,462 @@
+"""
+Numpy-only inference for the exported MLP surrogate (`model_weights.npz`).
+
+The weights come from scikit-learn's `MLPRegressor` + `StandardScaler` (see `code/model/train.py`),
+but serving only needs numpy so the backend stays small enough for serverless deployment.
+"""
+from __future__ import annotations
+
+import json
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Features: [storage, rain, effect, a, b, c]
+N_FEATURES = 6
+
+# Compact variants exported by `code/model/variants.py` under `<variant>__*` keys ("full" = unprefixed keys)
+VARIANTS = ("full", "distilled", "pruned", "int8")
+
+# Multi-step trajectory surrogate exported by `code/model/train.py` under `traj__*` keys
+TRAJECTORY_PREFIX = "traj"
+
+# Largest batch served from the reusable per-thread buffers; bigger batches allocate temporaries.
+MAX_BUFFER_ROWS = 4096
+
+
+def variant_params(params: Dict[str, np.ndarray], variant: str = "full") -> Dict[str, np.ndarray]:
+    """Unprefixed `w_i`/`b_i` + scaler arrays for a variant, with int8 weights dequantized. Raises ValueError if absent."""
+    if variant == "full":
+        return params
+    prefix = f"{variant}__"
+    if f"{prefix}w_0" not in params:
+        raise ValueError(f"variant {variant!r} not found in weights file")
+    meta = variant_metadata(params, variant)
+    # err_vs_full is the worst per-zone relative error; metadata without zone_errors predates the per-zone check
+    # (the trajectory / ensemble entries carry no metadata and are checked by the backend itself)
+    if meta and "zone_errors" not in meta:
+        raise ValueError(f"variant {variant!r} was not checked against the scenario zones; re-export the weights")
+    if meta and meta["err_vs_full"] > meta.get("error_budget", 0.0):
+        raise ValueError(f"variant {variant!r} exceeds its error budget: {meta}")
+    # Variants share the top-level scaler unless they ship their own (e.g. the trajectory model)
+    out = {k: params.get(f"{prefix}{k}", params.get(k)) for k in ("scaler_mean", "scaler_scale")}
+    out = {k: v for k, v in out.items() if v is not None}
+    i = 0
+    while f"{prefix}w_{i}" in params:
+        w = np.asarray(params[f"{prefix}w_{i}"])
+        if f"{prefix}s_{i}" in params:
+            w = w.astype(np.float64) * np.asarray(params[f"{prefix}s_{i}"], dtype=np.float64)
+        out[f"w_{i}"] = w
+        if f"{prefix}b_{i}" in params:
+            out[f"b_{i}"] = params[f"{prefix}b_{i}"]
+        i += 1
+    return out
+
+
+def variant_metadata(params: Dict[str, np.ndarray], variant: str) -> Dict:
+    """Metadata recorded by the export pipeline for a variant (empty for "full" or older weight files)."""
+    key = f"{variant}__meta"
+    return json.loads(str(params[key])) if key in params else {}
+
+
+def _flush_subnormals(a: np.ndarray) -> np.ndarray:
+    a[np.abs(a) < np.finfo(a.dtype).tiny] = 0.0
+    return a
+
+
+class SurrogateEngine:
+    """
+    Precompiled MLP surrogate built once at load time.
+
+    - The scaler is folded into the first layer: ((x - m) / s) @ W0 + b0 == x @ (W0 / s) + (b0 - (m / s) @ W0)
+    - Weights are validated once here instead of guarding every call with try/except.
+    - Inference runs in `dtype` (float64 by default, float32 for cheaper matmuls).
+    - Subnormal weights (left by weight decay on unused connections, or by the float32 cast) are flushed
+      to zero: they contribute nothing but make every matmul touching them an order of magnitude slower.
+    - Input and hidden-layer buffers are preallocated and reused. They are kept per thread because the
+      sync FastAPI handlers run on a thread pool.
+    """
+
+    def __init__(self, layers: Sequence[Tuple[np.ndarray, np.ndarray]], dtype=np.float64):
+        self.dtype = np.dtype(dtype)
+        self.layers: Tuple[Tuple[np.ndarray, np.ndarray], ...] = tuple(
+            (_flush_subnormals(np.array(w, dtype=self.dtype)), _flush_subnormals(np.array(b, dtype=self.dtype)))
+            for w, b in layers
+        )
+        self.n_inputs = self.layers[0][0].shape[0]
+        self.n_outputs = self.layers[-1][0].shape[1]
+        self._widths = [self.n_inputs] + [w.shape[1] for w, _ in self.layers]
+        self._local = threading.local()
+        self.variant = "full"
+
+    @classmethod
+    def from_params(
+        cls,
+        params: Dict[str, np.ndarray],
+        dtype=np.float64,
+        variant: str = "full",
+        n_inputs: int = N_FEATURES,
+        n_outputs: int = 1,
+    ) -> "SurrogateEngine":
+        """Build an engine from exported npz arrays (`scaler_*`, `w_i`, `b_i`). Raises ValueError if invalid."""
+        params = variant_params(params, variant)
+        try:
+            mean = np.asarray(params["scaler_mean"], dtype=np.float64).reshape(-1)
+            scale = np.asarray(params["scaler_scale"], dtype=np.float64).reshape(-1)
+        except KeyError as e:
+            raise ValueError(f"missing scaler array {e}") from e
+        if mean.shape != (n_inputs,) or scale.shape != (n_inputs,):
+            raise ValueError(f"scaler must have {n_inputs} features, got {mean.shape} / {scale.shape}")
+        if not np.all(np.isfinite(mean)) or not np.all(np.isfinite(scale)) or np.any(scale == 0):
+            raise ValueError("scaler contains non-finite or zero entries")
+
+        layers: List[Tuple[np.ndarray, np.ndarray]] = []
+        width = n_inputs
+        i = 0
+        while f"w_{i}" in params:
+            if f"b_{i}" not in params:
+                raise ValueError(f"missing bias b_{i}")
+            w = np.asarray(params[f"w_{i}"], dtype=np.float64)
+            b = np.asarray(params[f"b_{i}"], dtype=np.float64).reshape(-1)
+            if w.ndim != 2 or w.shape[0] != width or b.shape != (w.shape[1],):
+                raise ValueError(f"layer {i} has inconsistent shapes w={w.shape} b={b.shape} (input width {width})")
+            if not np.all(np.isfinite(w)) or not np.all(np.isfinite(b)):
+                raise ValueError(f"layer {i} contains non-finite weights")
+            layers.append((w, b))
+            width = w.shape[1]
+            i += 1
+        if not layers:
+            raise ValueError("no layers found (expected w_0, b_0, ...)")
+        if width != n_outputs:
+            raise ValueError(f"output layer must have width {n_outputs}, got {width}")
+
+        w0, b0 = layers[0]
+        layers[0] = (w0 / scale[:, None], b0 - (mean / scale) @ w0)
+        engine = cls(layers, dtype=dtype)
+        engine.variant = variant
+        return engine
+
+    def _buffers(self, n: int) -> List[np.ndarray]:
+        """Per-thread [input, hidden..., output] buffers with at least `n` rows."""
+        if n > MAX_BUFFER_ROWS:
+            return [np.empty((n, k), dtype=self.dtype) for k in self._widths]
+        bufs = getattr(self._local, "buffers", None)
+        if bufs is None or bufs[0].shape[0] < n:
+            rows = 1
+            while rows < n:
+                rows *= 2
+            bufs = [np.empty((rows, k), dtype=self.dtype) for k in self._widths]
+            self._local.buffers = bufs
+        return bufs
+
+    def _forward(self, bufs: List[np.ndarray], n: int) -> np.ndarray:
+        """Run the network on the first `n` rows of the input buffer. Returns an (n, n_outputs) view into the output buffer."""
+        h = bufs[0][:n]
+        last = len(self.layers) - 1
+        for i, (w, b) in enumerate(self.layers):
+            out = bufs[i + 1][:n]
+            np.matmul(h, w, out=out)
+            out += b
+            if i < last:
+                np.maximum(out, 0, out=out)
+            h = out
+        return h
+
+    def predict(self, storage: float, rain: float, effect: float, a: float, b: float, c: float) -> float:
+        """Single transition; clamped at zero."""
+        bufs = self._buffers(1)
+        bufs[0][0] = (storage, rain, effect, a, b, c)
+        return max(float(self._forward(bufs, 1)[0, 0]), 0.0)
+
+    def predict_batch(self, storages, rains, effects, a, b, c) -> np.ndarray:
+        """Broadcasting batch of transitions; returns float64 next storages clamped at zero."""
+        cols = (storages, rains, effects, a, b, c)
+        shape = np.broadcast_shapes(*(np.shape(v) for v in cols))
+        n = int(np.prod(shape, dtype=np.int64))
+        if n == 0:
+            return np.zeros(shape, dtype=np.float64)
+        bufs = self._buffers(n)
+        x = bufs[0][:n].reshape(shape + (N_FEATURES,))
+        for j, v in enumerate(cols):
+            x[..., j] = v
+        pred = self._forward(bufs, n)[:, 0]
+        return np.maximum(pred, 0.0).astype(np.float64, copy=False).reshape(shape)
+
+
+class TrajectorySurrogate:
+    """
+    Multi-step surrogate: [S0, rain_1..rain_k, effect, a, b, c] -> [S_1..S_k] in one forward pass.
+
+    The effect is applied on the first step only (the action being evaluated), matching the rollouts in
+    `GameSession._simulate_cvar_rollout`. Shorter horizons pad the unused rain inputs with zeros and keep
+    the leading outputs; the training windows include zero-padded tails (`code/model/data_gen.py`) so
+    these inputs are in distribution, and the backend checks every horizon against chained one-step calls.
+    """
+
+    def __init__(self, engine: SurrogateEngine, horizon: int):
+        if engine.n_inputs != horizon + 5 or engine.n_outputs != horizon:
+            raise ValueError(f"trajectory engine shape {engine.n_inputs}->{engine.n_outputs} does not match horizon {horizon}")
+        self.engine = engine
+        self.horizon = horizon
+
+    @classmethod
+    def from_params(cls, params: Dict[str, np.ndarray], dtype=np.float64) -> Optional["TrajectorySurrogate"]:
+        """Build from `traj__*` arrays; None if the weights file has no trajectory model. Raises ValueError if invalid."""
+        key = f"{TRAJECTORY_PREFIX}__horizon"
+        if key not in params:
+            return None
+        horizon = int(params[key])
+        engine = SurrogateEngine.from_params(
+            params, dtype=dtype, variant=TRAJECTORY_PREFIX, n_inputs=horizon + 5, n_outputs=horizon
+        )
+        return cls(engine, horizon)
+
+    def predict_batch(self, storages, rains, effects, a, b, c) -> np.ndarray:
+        """
+        `rains` has a trailing horizon axis (..., h) with h <= self.horizon; the other arguments broadcast
+        against rains[..., 0]. Returns float64 storages of shape (..., h), clamped at zero.
+        """
+        rains = np.asarray(rains, dtype=np.float64)
+        h = rains.shape[-1]
+        if not 0 < h <= self.horizon:
+            raise ValueError(f"horizon {h} does not fit trajectory model horizon {self.horizon}")
+        k = self.horizon
+        shape = np.broadcast_shapes(np.shape(storages), rains.shape[:-1], np.shape(effects), np.shape(a), np.shape(b), np.shape(c))
+        n = int(np.prod(shape, dtype=np.int64))
+        if n == 0:
+            return np.zeros(shape + (h,), dtype=np.float64)
+        bufs = self.engine._buffers(n)
+        x = bufs[0][:n].reshape(shape + (k + 5,))
+        x[..., 0] = storages
+        x[..., 1:1 + h] = rains
+        x[..., 1 + h:1 + k] = 0.0
+        x[..., k + 1] = effects
+        x[..., k + 2] = a
+        x[..., k + 3] = b
+        x[..., k + 4] = c
+        pred = self.engine._forward(bufs, n)[:, :h]
+        return np.maximum(pred, 0.0).astype(np.float64, copy=False).reshape(shape + (h,))
+
+
+# Grid cap per zone table (cells); refinement stops here even if the error bound is not met.
+MAX_LUT_CELLS = 1 << 18
+
+
+class SurrogateLUT:
+    """
+    Per-zone table of surrogate outputs for one zone's fixed (a, b, c): one (storage, rain) grid per
+    discrete action effect.
+
+    Effects only take the scenario's action values, so they index a grid exactly instead of being
+    interpolated; storage and rain are answered by bilinear interpolation. Callers fall back to the MLP
+    for points outside the grid or with any other effect. `max_error` is the largest deviation from the
+    MLP measured at build time, relative to max(|MLP|, `scale`).
+    """
+
+    def __init__(
+        self,
+        predict_batch,
+        a: float,
+        b: float,
+        c: float,
+        upper: Sequence[float],
+        effects: Sequence[float],
+        shape: Sequence[int],
+        scale: float = 1.0,
+    ):
+        self.a, self.b, self.c = float(a), float(b), float(c)
+        self.upper = tuple(float(u) if u > 0 else 1.0 for u in upper)
+        self.effects = tuple(sorted({float(e) for e in effects} | {0.0}))
+        self.shape = tuple(int(n) for n in shape)
+        self.scale = float(scale)
+        self._effect_index = {e: k for k, e in enumerate(self.effects)}
+        self._effects_np = np.asarray(self.effects)
+        axes = [np.linspace(0.0, u, n) for u, n in zip(self.upper, self.shape)]
+        grid_s, grid_r = np.meshgrid(*axes, indexing="ij")
+        self.table = np.ascontiguousarray(
+            predict_batch(grid_s, grid_r, self._effects_np[:, None, None], self.a, self.b, self.c), dtype=np.float64
+        )
+        self._flat_np = self.table.reshape(-1)
+        # Plain-list copy: indexing a list is much cheaper than indexing numpy for the scalar path
+        self._flat = self._flat_np.tolist()
+        self._inv = tuple((n - 1) / u for u, n in zip(self.upper, self.shape))
+        self._last = tuple(n - 1 for n in self.shape)
+        self._stride = (self.shape[0] * self.shape[1], self.shape[1])
+        self.max_error = float("inf")
+
+    @property
+    def cells(self) -> int:
+        return len(self.effects) * self.shape[0] * self.shape[1]
+
+    def _error(self, predict_batch, s: np.ndarray, r: np.ndarray, e: np.ndarray) -> float:
+        approx, _ = self.predict_batch(s, r, e)
+        exact = predict_batch(s, r, e, self.a, self.b, self.c)
+        return float(np.max(np.abs(approx - exact) / np.maximum(np.abs(exact), self.scale)))
+
+    def measure_error(self, predict_batch, n_points: int = 4096, seed: int = 0) -> float:
+        """Max relative |LUT - MLP| over random in-grid points and table effects (deterministic for a given seed)."""
+        rng = np.random.default_rng(seed)
+        pts = rng.uniform(0.0, 1.0, size=(n_points, 2)) * np.asarray(self.upper)
+        e = self._effects_np[rng.integers(0, len(self.effects), size=n_points)]
+        self.max_error = self._error(predict_batch, pts[:, 0], pts[:, 1], e)
+        return self.max_error
+
+    def axis_errors(self, predict_batch, n_points: int = 2048, seed: int = 0) -> Tuple[float, float]:
+        """Relative errors from interpolating along storage only and along rain only (the other axis on grid nodes)."""
+        rng = np.random.default_rng(seed)
+        e = self._effects_np[rng.integers(0, len(self.effects), size=n_points)]
+        errors = []
+        for axis in range(2):
+            pts = np.empty((n_points, 2))
+            pts[:, axis] = rng.uniform(0.0, self.upper[axis], size=n_points)
+            other = 1 - axis
+            pts[:, other] = rng.integers(0, self.shape[other], size=n_points) / self._inv[other]
+            errors.append(self._error(predict_batch, pts[:, 0], pts[:, 1], e))
+        return errors[0], errors[1]
+
+    def predict(self, storage: float, rain: float, effect: float) -> Optional[float]:
+        """Interpolated next storage, or None if the point lies outside the grid or the effect is not tabulated."""
+        k = self._effect_index.get(effect)
+        fs, fr = storage * self._inv[0], rain * self._inv[1]
+        ls, lr = self._last
+        if k is None or not (0.0 <= fs <= ls and 0.0 <= fr <= lr):
+            return None
+        i, j = min(int(fs), ls - 1), min(int(fr), lr - 1)
+        ds, dr = fs - i, fr - j
+        sk, si = self._stride
+        t = self._flat
+        base = k * sk + i * si + j
+        c0 = t[base] + (t[base + 1] - t[base]) * dr
+        c1 = t[base + si] + (t[base + si + 1] - t[base + si]) * dr
+        return c0 + (c1 - c0) * ds
+
+    def predict_batch(self, storages, rains, effects) -> Tuple[np.ndarray, np.ndarray]:
+        """Vectorized interpolation. Returns (values, inside); values outside the grid are clamped-edge estimates."""
+        s, r, e = np.broadcast_arrays(*(np.asarray(v, dtype=np.float64) for v in (storages, rains, effects)))
+        k = np.minimum(np.searchsorted(self._effects_np, e), len(self.effects) - 1)
+        inside = self._effects_np[k] == e
+        idx = []
+        frac = []
+        for f, last in zip((s * self._inv[0], r * self._inv[1]), self._last):
+            inside &= (f >= 0.0) & (f <= last)
+            f = np.clip(f, 0.0, last)
+            i = np.minimum(f.astype(np.intp), last - 1)
+            idx.append(i)
+            frac.append(f - i)
+        sk, si = self._stride
+        t = self._flat_np
+        base = k * sk + idx[0] * si + idx[1]
+        ds, dr = frac
+        c0 = t[base] + (t[base + 1] - t[base]) * dr
+        c1 = t[base + si] + (t[base + si + 1] - t[base + si]) * dr
+        return c0 + (c1 - c0) * ds, inside
+
+
+def build_zone_lut(
+    predict_batch,
+    a: float,
+    b: float,
+    c: float,
+    upper: Sequence[float],
+    effects: Sequence[float],
+    max_error: float,
+    scale: float = 1.0,
+    shape: Sequence[int] = (33, 33),
+) -> Optional[SurrogateLUT]:
+    """
+    Build a zone table over [0, upper] for the given effects and refine it until the measured relative error
+    against `predict_batch` is within `max_error`. Each refinement doubles the resolution of the axis whose
+    interpolation error is larger. Returns None if the bound cannot be met under MAX_LUT_CELLS.
+    """
+    shape = [max(int(n), 2) for n in shape]
+    while True:
+        lut = SurrogateLUT(predict_batch, a, b, c, upper, effects, shape, scale=scale)
+        if lut.measure_error(predict_batch) <= max_error:
+            return lut
+        err_s, err_r = lut.axis_errors(predict_batch)
+        axis = 0 if err_s >= err_r else 1
+        shape[axis] = 2 * shape[axis] - 1
+        if len(lut.effects) * shape[0] * shape[1] > MAX_LUT_CELLS:
+            return None
+
+
+# Stacked ensemble exported by `code/model/train.py` under `ens__*` keys
+ENSEMBLE_PREFIX = "ens"
+
+
+class SurrogateEnsemble:
+    """
+    N one-step surrogates with identical shapes whose weights are stacked into (N, in, out) tensors,
+    so every member runs in the same batched matmul. The spread across members is the model's
+    epistemic uncertainty.
+    """
+
+    def __init__(self, layers: Sequence[Tuple[np.ndarray, np.ndarray]], dtype=np.float64):
+        self.dtype = np.dtype(dtype)
+        self.layers = tuple(
+            (_flush_subnormals(np.array(w, dtype=self.dtype)), _flush_subnormals(np.array(b[:, None, :], dtype=self.dtype)))
+            for w, b in layers
+        )
+        self.n_members = self.layers[0][0].shape[0]
+
+    @classmethod
+    def from_params(cls, params: Dict[str, np.ndarray], dtype=np.float64) -> Optional["SurrogateEnsemble"]:
+        """Build from `ens__*` arrays; None if the weights file has no ensemble. Raises ValueError if invalid."""
+        prefix = f"{ENSEMBLE_PREFIX}__"
+        if f"{prefix}w_0" not in params:
+            return None
+        try:
+            mean = np.asarray(params.get(f"{prefix}scaler_mean", params["scaler_mean"]), dtype=np.float64).reshape(-1)
+            scale = np.asarray(params.get(f"{prefix}scaler_scale", params["scaler_scale"]), dtype=np.float64).reshape(-1)
+        except KeyError as e:
+            raise ValueError(f"missing scaler array {e}") from e
+        if mean.shape != (N_FEATURES,) or scale.shape != (N_FEATURES,) or np.any(scale == 0):
+            raise ValueError(f"ensemble scaler must have {N_FEATURES} non-zero features")
+
+        layers: List[Tuple[np.ndarray, np.ndarray]] = []
+        width, members = N_FEATURES, None
+        i = 0
+        while f"{prefix}w_{i}" in params:
+            w = np.asarray(params[f"{prefix}w_{i}"], dtype=np.float64)
+            b = np.asarray(params.get(f"{prefix}b_{i}"), dtype=np.float64)
+            members = w.shape[0] if members is None else members
+            if w.ndim != 3 or w.shape[0] != members or w.shape[1] != width or b.shape != (members, w.shape[2]):
+                raise ValueError(f"ensemble layer {i} has inconsistent shapes w={w.shape} b={b.shape}")
+            if not np.all(np.isfinite(w)) or not np.all(np.isfinite(b)):
+                raise ValueError(f"ensemble layer {i} contains non-finite weights")
+            layers.append((w, b))
+            width = w.shape[2]
+            i += 1
+        if width != 1:
+            raise ValueError(f"ensemble output layer must have width 1, got {width}")
+
+        # Fold the shared scaler into every member's first layer
+        w0, b0 = layers[0]
+        layers[0] = (w0 / scale[None, :, None], b0 - np.einsum("i,nio->no", mean / scale, w0))
+        return cls(layers, dtype=dtype)
+
+    def predict_members(self, storages, rains, effects, a, b, c, per_member: bool = False) -> np.ndarray:
+        """
+        Broadcasting batch of transitions; returns (n_members,) + broadcast shape, clamped at zero.
+
+        With `per_member=True` the inputs already carry a leading member axis (e.g. storages carried
+        forward by each member) and member i only sees slice i; the result keeps the broadcast shape.
+        """
+        cols = (storages, rains, effects, a, b, c)
+        shape = np.broadcast_shapes(*(np.shape(v) for v in cols))
+        if per_member and (not shape or shape[0] != self.n_members):
+            raise ValueError(f"per-member inputs need a leading axis of {self.n_members}, got {shape}")
+        x = np.empty(shape + (N_FEATURES,), dtype=self.dtype)
+        for j, v in enumerate(cols):
+            x[..., j] = v
+        # (1 or N, n, in) @ (N, in, out) -> (N, n, out): one stacked matmul per layer
+        h = x.reshape(self.n_members if per_member else 1, -1, N_FEATURES)
+        last = len(self.layers) - 1
+        for i, (w, bias) in enumerate(self.layers):
+            h = np.matmul(h, w)
+            h += bias
+            if i < last:
+                np.maximum(h, 0, out=h)
+        out = np.maximum(h[..., 0], 0.0).astype(np.float64, copy=False)
+        return out.reshape(shape if per_member else (self.n_members,) + shape)
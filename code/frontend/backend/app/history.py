@@ -0,0 +1,109 @@
+"""
+Columnar episode history for a game session.
+
+One preallocated numpy row per response, indexed by t (0 = the initial response, then one per step),
+instead of a pydantic StepResponse per step. Repeated values (the (action, zone) pair taken, the
+recommendation's action, zone and bilingual reason texts) are interned in the history's own `values` table
+and stored as integer ids, so they are freed with the session. GameSession turns rows back into
+StepResponse objects only for /replay.
+"""
+from __future__ import annotations
+
+from typing import Dict, Hashable, List, Optional, Sequence
+
+import numpy as np
+
+# Event bitmask: bits 0-2 are session-wide events, bit EVENT_CRITICAL_SHIFT + i is critical flooding in zone i
+EVENT_FUNDING = 1 << 0
+EVENT_GRANT = 1 << 1
+EVENT_REMOVED = 1 << 2
+EVENT_CRITICAL_SHIFT = 3
+
+
+class InternPool:
+    """Table of hashable values, so columns can hold small integer ids instead of objects."""
+
+    def __init__(self):
+        self._ids: Dict[Hashable, int] = {}
+        self._values: List[Hashable] = []
+        self.nbytes = 0  # rough size of the interned values
+
+    def intern(self, value: Hashable) -> int:
+        idx = self._ids.get(value)
+        if idx is None:
+            idx = len(self._values)
+            self._ids[value] = idx
+            self._values.append(value)
+            self.nbytes += 64 + len(repr(value))
+        return idx
+
+    def __getitem__(self, idx: int) -> Hashable:
+        return self._values[idx]
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+
+
+class EpisodeHistory:
+    """Struct-of-arrays record of one episode; rows are written in order of t and filled in with advice later."""
+
+    def __init__(self, n_rows: int, n_zones: int, n_actions: int, horizon: int = 3):
+        self.rows = 0
+        self.values = InternPool()  # per session: the strings it holds come from this episode only
+        self.action = np.full(n_rows, -1, dtype=np.int32)  # values id of (action, zone)
+        self.storage = np.zeros((n_rows, n_zones))
+        self.budget = np.zeros(n_rows)
+        self.trust = np.zeros(n_rows)  # raw trust (the response shows it clamped and rounded)
+        self.reward = np.zeros(n_rows)
+        self.total_reward = np.zeros(n_rows)
+        self.cooldowns = np.zeros((n_rows, n_actions), dtype=np.int32)
+        self.events = np.zeros(n_rows, dtype=np.uint32)
+        # risk_mean / risk_std / prob_critical per horizon hour; forecast_len -1 = no forecast for that row
+        self.forecast = np.zeros((n_rows, 3, horizon))
+        self.forecast_len = np.full(n_rows, -1, dtype=np.int8)
+        # values id of (action, zone, reason, top_reasons); -1 = no recommendation for that row
+        self.rec = np.full(n_rows, -1, dtype=np.int32)
+        self.rec_loss = np.zeros(n_rows)
+        self.rec_confidence = np.zeros(n_rows)
+
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes + sum(v.nbytes for v in vars(self).values() if isinstance(v, np.ndarray))
+
+    def record(
+        self,
+        t: int,
+        action: str,
+        zone_id: Optional[str],
+        storage: Sequence[float],
+        budget: float,
+        trust: float,
+        reward: float,
+        total_reward: float,
+        cooldowns: Sequence[int],
+        events: int,
+    ) -> None:
+        self.action[t] = self.values.intern((action, zone_id))
+        self.storage[t] = storage
+        self.budget[t] = budget
+        self.trust[t] = trust
+        self.reward[t] = reward
+        self.total_reward[t] = total_reward
+        self.cooldowns[t] = cooldowns
+        self.events[t] = events
+        self.rows = max(self.rows, t + 1)
+
+    def record_forecast(self, t: int, risk_mean: Sequence[float], risk_std: Sequence[float], prob_critical: Sequence[float]) -> None:
+        n = min(len(risk_mean), self.forecast.shape[2])
+        self.forecast[t, 0, :n] = risk_mean[:n]
+        self.forecast[t, 1, :n] = risk_std[:n]
+        self.forecast[t, 2, :n] = prob_critical[:n]
+        self.forecast_len[t] = n
+
+    def record_recommendation(
+        self, t: int, action: str, zone_id: Optional[str], reason: str, top_reasons: Sequence[str], expected_loss: float, confidence: float
+    ) -> None:
+        self.rec[t] = self.values.intern((action, zone_id, reason, tuple(top_reasons)))
+        self.rec_loss[t] = expected_loss
+        self.rec_confidence[t] = confidence
@@ -1,20 +1,34 @@
 from __future__ import annotations
 
+import copy
+import hashlib
 import json
 import math
-import random
+import secrets
 import uuid
 import logging
+import multiprocessing
+import threading
 import numpy as np
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, List, Optional, Any, Tuple
+from types import MappingProxyType
+from typing import Dict, Iterator, List, Mapping, NamedTuple, Optional, Any, Sequence, Tuple
 import os
 import sys
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field
+
+from .history import EVENT_CRITICAL_SHIFT, EVENT_FUNDING, EVENT_GRANT, EVENT_REMOVED, EpisodeHistory
+from .policy import PolicyTable, load_policy_tables, scenario_fingerprint
+from .registry import SnapshotRegistry
+from .sampling import SAMPLING_METHODS, RainSampler
+from .sessions import KeyValueSessionStore, LocalKeyValue, MemorySessionStore, SessionStore, SQLiteSessionStore
+from .surrogate import SurrogateEngine, SurrogateEnsemble, SurrogateLUT, TrajectorySurrogate, build_zone_lut
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -28,6 +42,9 @@ CODE_DIR = Path(__file__).resolve().parents[2]  # .../code
 SCENARIO_DIR = CODE_DIR / "data" / "scenarios"
 PARAM_FILE = SCENARIO_DIR / "scenario_params.json"
 MODEL_DIR = CODE_DIR / "model"
+# Scenario definitions and rainfall CSVs are reloaded when they change on disk; files are checked at most
+# every FLOOD_SCENARIO_CHECK_S seconds (0 = on every request)
+SCENARIO_CHECK_S = float(os.environ.get("FLOOD_SCENARIO_CHECK_S", "1.0"))
 
 logger.info(f"Paths initialized: CODE_DIR={CODE_DIR}, SCENARIO_DIR={SCENARIO_DIR}, MODEL_DIR={MODEL_DIR}")
 
@@ -56,45 +73,285 @@ try:
 except Exception as e:
     logger.error(f"Failed to load ML weights: {e}")
 
-def relu(x):
-    return np.maximum(0, x)
+# Precompiled inference engine (scaler folded into layer 0, weights validated once).
+# FLOOD_SURROGATE_DTYPE=float32 trades a little precision for cheaper matmuls on CPU-only instances.
+# FLOOD_SURROGATE_VARIANT selects a compact variant (distilled / pruned / int8) exported by code/model/train.py.
+SURROGATE_DTYPE = os.environ.get("FLOOD_SURROGATE_DTYPE", "float64")
+SURROGATE_VARIANT = os.environ.get("FLOOD_SURROGATE_VARIANT", "full")
+SURROGATE: Optional[SurrogateEngine] = None
+if ML_PARAMS:
+    for _variant in dict.fromkeys([SURROGATE_VARIANT, "full"]):
+        try:
+            if SURROGATE_DTYPE not in ("float32", "float64"):
+                raise ValueError(f"unsupported FLOOD_SURROGATE_DTYPE={SURROGATE_DTYPE!r}")
+            SURROGATE = SurrogateEngine.from_params(ML_PARAMS, dtype=SURROGATE_DTYPE, variant=_variant)
+            logger.info(f"Surrogate engine ready ({_variant}, {SURROGATE_DTYPE}, {len(SURROGATE.layers)} layers).")
+            break
+        except ValueError as e:
+            logger.error(f"Cannot use surrogate variant {_variant!r}: {e}")
+    if SURROGATE is None:
+        logger.error("Invalid ML weights, falling back to formula.")
+
+# Multi-step trajectory surrogate (traj__* in model_weights.npz): predicts a whole k-hour rollout in one
+# forward pass and is used by CVaR rollouts whose horizon fits. Off by default (FLOOD_SURROGATE_TRAJECTORY=1
+# enables it): its small per-hour deviations still flip CVaR recommendations on close calls (12.5% of
+# city_commander_basic's steps in code/model/benchmark.py's episode replay), which the error check below does
+# not catch.
+# It is only used for zones whose check against chained one-step calls passed when their scenario loaded:
+# the 99th percentile of |trajectory - chained| relative to max(|chained|, zone threshold), over every
+# horizon up to k, must stay within FLOOD_TRAJECTORY_MAX_ERROR.
+TRAJECTORY_MAX_ERROR = float(os.environ.get("FLOOD_TRAJECTORY_MAX_ERROR", "0.05"))
+TRAJECTORY_CHECK_POINTS = 2048
+TRAJECTORY_ERRORS: Dict[Tuple[float, float, float], float] = {}  # measured error per checked zone (a, b, c)
+TRAJECTORY: Optional[TrajectorySurrogate] = None
+if SURROGATE is not None and os.environ.get("FLOOD_SURROGATE_TRAJECTORY", "0") == "1":
+    try:
+        TRAJECTORY = TrajectorySurrogate.from_params(ML_PARAMS, dtype=SURROGATE_DTYPE)
+        if TRAJECTORY is not None:
+            logger.info(f"Trajectory surrogate ready (horizon {TRAJECTORY.horizon}).")
+    except ValueError as e:
+        logger.error(f"Invalid trajectory weights, using one-step rollouts: {e}")
+
+# Stacked surrogate ensemble (ens__* in model_weights.npz): all members run as one batched matmul and their
+# spread around their mean, added to the serving engine's prediction, feeds the forecast's risk_std /
+# prob_critical. FLOOD_SURROGATE_ENSEMBLE=0 disables it.
+ENSEMBLE: Optional[SurrogateEnsemble] = None
+if SURROGATE is not None and os.environ.get("FLOOD_SURROGATE_ENSEMBLE", "1") == "1":
+    try:
+        ENSEMBLE = SurrogateEnsemble.from_params(ML_PARAMS, dtype=SURROGATE_DTYPE)
+        if ENSEMBLE is not None:
+            logger.info(f"Surrogate ensemble ready ({ENSEMBLE.n_members} members).")
+    except ValueError as e:
+        logger.error(f"Invalid ensemble weights, forecast uses rain uncertainty only: {e}")
+
+# Optional per-zone lookup tables (FLOOD_SURROGATE_LUT=1): each zone's (a, b, c) is fixed for a scenario,
+# so the MLP is tabulated over (storage, rain) for every action effect once and queried by bilinear interpolation.
+# FLOOD_LUT_MAX_ERROR bounds the measured deviation from the MLP relative to max(|MLP|, zone threshold);
+# zones that cannot meet it keep using the MLP. Only the scalar path (`predict_next_storage`) uses them; batched
+# rollouts and forecasts already amortize the MLP over the whole batch and stay on it.
+SURROGATE_LUT = os.environ.get("FLOOD_SURROGATE_LUT", "0") == "1"
+LUT_MAX_ERROR = float(os.environ.get("FLOOD_LUT_MAX_ERROR", "0.01"))
+# Rain perturbation range used by forecast/recommendation Monte Carlo (also sizes the LUT rain axis)
+RAIN_PERTURB_LOW, RAIN_PERTURB_HIGH = 0.6, 1.4
+ZONE_LUTS: Dict[Tuple[float, float, float], SurrogateLUT] = {}
+
+# Forecast Monte Carlo: FLOOD_FORECAST_SAMPLES rain samples per hour (vectorized, so large counts are cheap);
+# FLOOD_FORECAST_CARRY=1 carries simulated storage forward across the horizon instead of projecting each
+# hour from the current storage.
+FORECAST_SAMPLES = int(os.environ.get("FLOOD_FORECAST_SAMPLES", "15"))
+FORECAST_CARRY = os.environ.get("FLOOD_FORECAST_CARRY", "0") == "1"
+
+# CVaR recommender sampling: FLOOD_SAMPLING=iid|lhs|sobol draws the rain perturbations; every candidate starts
+# with FLOOD_CVAR_MIN_SAMPLES and samples double until the best-vs-second CVaR gap is resolved or
+# FLOOD_CVAR_MAX_SAMPLES is reached. Gaps whose standard error is below FLOOD_CVAR_TOLERANCE count as resolved.
+SAMPLING_METHOD = os.environ.get("FLOOD_SAMPLING", "sobol")
+if SAMPLING_METHOD not in SAMPLING_METHODS:
+    logger.error(f"Unknown FLOOD_SAMPLING={SAMPLING_METHOD!r}, using iid.")
+    SAMPLING_METHOD = "iid"
+CVAR_MIN_SAMPLES = int(os.environ.get("FLOOD_CVAR_MIN_SAMPLES", "16"))
+CVAR_MAX_SAMPLES = int(os.environ.get("FLOOD_CVAR_MAX_SAMPLES", "256"))
+CVAR_TOLERANCE = float(os.environ.get("FLOOD_CVAR_TOLERANCE", "0.05"))
+# Rain factors are drawn in whole blocks of this many rows, so an LHS block is stratified over the largest
+# sample count any caller uses and row k of a step never depends on which caller asked first.
+FACTOR_BLOCK = max(FORECAST_SAMPLES, CVAR_MAX_SAMPLES, 1)
+CVAR_Z = 1.96
+CVAR_BOOTSTRAP = 200
+# Candidate racing (FLOOD_CVAR_RACING=1): after every sample round, candidates whose CVaR is worse than the
+# current best by more than CVAR_Z paired standard errors are dropped and receive no further samples.
+# RACING_STATS accumulates simulated vs skipped rollouts across calls (exposed in /api/debug).
+CVAR_RACING = os.environ.get("FLOOD_CVAR_RACING", "1") == "1"
+RACING_STATS = {"calls": 0, "rollouts": 0, "rollouts_saved": 0}
+RACING_STATS_LOCK = threading.Lock()  # updated from request and speculation threads
+
+# Speculative advice (FLOOD_SPECULATE=1): after each /start and /step, the forecast and recommendation that
+# would follow the likeliest next actions (current recommendation, "none", the last action) are precomputed
+# on FLOOD_SPECULATE_WORKERS background threads; a matching /step then reuses them.
+SPECULATE = os.environ.get("FLOOD_SPECULATE", "0") == "1"
+SPECULATE_WORKERS = int(os.environ.get("FLOOD_SPECULATE_WORKERS", "2"))
+SPECULATION_POOL = ThreadPoolExecutor(max_workers=SPECULATE_WORKERS, thread_name_prefix="speculate") if SPECULATE else None
+SPECULATION_STATS = {"submitted": 0, "hits": 0, "misses": 0, "cancelled": 0}
+SPECULATION_STATS_LOCK = threading.Lock()  # updated from concurrent request threads
+
+def count_speculation(outcome: str) -> None:
+    with SPECULATION_STATS_LOCK:
+        SPECULATION_STATS[outcome] += 1
+
+# Advice process pool (FLOOD_ADVICE_PROCESSES=N > 0): forecasts and recommendations run in N spawned worker
+# processes so concurrent sessions are not serialized on the GIL. Workers import this module once (scenarios,
+# rain series, surrogate weights, LUTs) and each job carries only the session's small state vector.
+ADVICE_PROCESSES = int(os.environ.get("FLOOD_ADVICE_PROCESSES", "0"))
+_ADVICE_POOL: Optional[ProcessPoolExecutor] = None
+_ADVICE_POOL_LOCK = threading.Lock()
+
+def advice_pool() -> Optional[ProcessPoolExecutor]:
+    """The shared advice process pool, started on first use (None when FLOOD_ADVICE_PROCESSES=0)."""
+    global _ADVICE_POOL
+    if ADVICE_PROCESSES <= 0:
+        return None
+    with _ADVICE_POOL_LOCK:
+        if _ADVICE_POOL is None:
+            _ADVICE_POOL = ProcessPoolExecutor(
+                max_workers=ADVICE_PROCESSES,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_advice_worker,
+            )
+            logger.info(f"Advice process pool started with {ADVICE_PROCESSES} workers.")
+    return _ADVICE_POOL
+
+def _init_advice_worker() -> None:
+    """Runs once per advice worker; importing this module has already loaded scenarios and weights."""
+    global ADVICE_PROCESSES
+    ADVICE_PROCESSES = 0  # workers compute their jobs in-process
+    logger.info(f"Advice worker {os.getpid()} ready ({len(SCENARIO_REGISTRY.current().scenarios)} scenarios).")
+
+# Session store: sessions idle for FLOOD_SESSION_TTL seconds expire, and the least recently used ones are
+# evicted beyond FLOOD_MAX_SESSIONS sessions or FLOOD_SESSION_MAX_BYTES approximate bytes (0 = no cap).
+# Requests for expired or evicted sessions get 410 Gone. FLOOD_SESSION_STORE selects where sessions live:
+# "memory" (default, single worker), "sqlite:<path>" (shared by the workers on one host), "redis://..." (shared
+# across hosts; needs the redis package) or "kv-local" (the in-process stand-in for the Redis store).
+SESSION_STORE = os.environ.get("FLOOD_SESSION_STORE", "memory")
+SESSION_TTL = float(os.environ.get("FLOOD_SESSION_TTL", "3600"))
+MAX_SESSIONS = int(os.environ.get("FLOOD_MAX_SESSIONS", "1000"))
+SESSION_MAX_BYTES = int(os.environ.get("FLOOD_SESSION_MAX_BYTES", "0"))
+SESSION_BASE_BYTES = 4096  # rough size of a session object with its dicts and last response
+STEP_RETRIES = 3  # /step attempts when another writer stored the session first (external stores)
+MAX_STEP_KEYS = 32  # idempotency keys remembered per session
+
+# Precomputed policy tables (FLOOD_POLICY=1): recommendations come from the value tables written by
+# code/model/solve_policy.py, with the Monte Carlo recommender as fallback for states outside a table
+# and for tables solved for different scenario parameters or rain.
+POLICY_DIR = CODE_DIR / "data" / "policies"
+POLICY_MODE = os.environ.get("FLOOD_POLICY", "0") == "1"
+POLICY_TRUST = 100.0  # trust assumed for future council grants (trust is not part of the table state)
+POLICY_STATS = {"hits": 0, "fallbacks": 0}
+POLICIES: Dict[str, PolicyTable] = {}
+if POLICY_MODE:
+    POLICIES, _policy_errors = load_policy_tables(POLICY_DIR)
+    for _msg in _policy_errors:
+        logger.warning(f"Skipping policy table {_msg}")
+    logger.info(f"Policy tables loaded for: {sorted(POLICIES)}")
 
 def predict_next_storage(current_storage: float, rain: float, effect: float, params: ZoneParams) -> float:
     """Predict next hour storage using Numpy-only inference or fallback to formula."""
-    if ML_PARAMS:
-        try:
-            # 1. Feature preparation
-            x = np.array([current_storage, rain, effect, params.a, params.b, params.c])
-            
-            # 2. Scale features
-            x_scaled = (x - ML_PARAMS["scaler_mean"]) / ML_PARAMS["scaler_scale"]
-            
-            # 3. MLP Forward Pass (Manual inference to remove scikit-learn dependency)
-            # Input -> Hidden 1 (64)
-            h1 = relu(x_scaled @ ML_PARAMS["w_0"] + ML_PARAMS["b_0"])
-            # Hidden 1 -> Hidden 2 (32)
-            h2 = relu(h1 @ ML_PARAMS["w_1"] + ML_PARAMS["b_1"])
-            # Hidden 2 -> Output (1)
-            pred = h2 @ ML_PARAMS["w_2"] + ML_PARAMS["b_2"]
-            
-            return max(float(pred), 0.0)
-        except Exception as e:
-            # Silently fallback on inference error
-            return max(params.a * current_storage + params.b * rain - params.c * effect, 0.0)
-    else:
-        # Fallback to deterministic formula
-        return max(params.a * current_storage + params.b * rain - params.c * effect, 0.0)
+    if SURROGATE is not None:
+        if ZONE_LUTS:
+            lut = ZONE_LUTS.get((params.a, params.b, params.c))
+            if lut is not None:
+                value = lut.predict(current_storage, rain, effect)
+                if value is not None:
+                    return value
+        return SURROGATE.predict(current_storage, rain, effect, params.a, params.b, params.c)
+    # Fallback to deterministic formula
+    return max(params.a * current_storage + params.b * rain - params.c * effect, 0.0)
+
+def predict_next_storage_batch(storages, rains, effects, a, b, c) -> np.ndarray:
+    """
+    Batched `predict_next_storage`: one matrix pass for many transitions.
+
+    All arguments are array-likes that broadcast against each other (e.g. storages of shape
+    (samples, zones) with per-zone `a`, `b`, `c` of shape (zones,)). Returns next storages with
+    the broadcast shape, clamped at zero, using the same engine and the same formula fallback
+    as the scalar path. Zone LUTs are not consulted: a batch would need a gather per zone plus the
+    off-grid MLP fallback, which costs more than the batched MLP pass itself.
+    """
+    if SURROGATE is not None:
+        return SURROGATE.predict_batch(storages, rains, effects, a, b, c)
+    s, r, e, pa, pb, pc = np.broadcast_arrays(
+        *(np.asarray(v, dtype=np.float64) for v in (storages, rains, effects, a, b, c))
+    )
+    return np.maximum(pa * s + pb * r - pc * e, 0.0)
+
+def zone_storage_max(zp: "ZoneParams", rain_max: float) -> float:
+    """Upper storage bound for tabulating / checking a zone: the steady state of the wettest perturbed hour."""
+    return max(zp.b * rain_max / max(1.0 - zp.a, 1e-3), 3.0 * zp.threshold) * 1.1
+
+def check_trajectory(scenario: ScenarioSpec, rain: Sequence[float]) -> None:
+    """
+    Measure the trajectory surrogate against chained one-step MLP calls for a scenario's zones, over windows
+    of its rain series with the Monte Carlo perturbation, storages up to `zone_storage_max` and its action
+    effects. Results go to TRAJECTORY_ERRORS; zones over the bound keep one-step rollouts.
+    """
+    if TRAJECTORY is None or SURROGATE is None:
+        return
+    rain = np.asarray(rain, dtype=np.float64)
+    if rain.size == 0:
+        return
+    k = TRAJECTORY.horizon
+    rng = np.random.default_rng(0)
+    n = TRAJECTORY_CHECK_POINTS
+    starts = rng.integers(0, len(rain), size=n)
+    windows = rain[np.minimum(starts[:, None] + np.arange(k), len(rain) - 1)]
+    rains = windows * rng.uniform(RAIN_PERTURB_LOW, RAIN_PERTURB_HIGH, size=(n, k))
+    effects = np.array([0.0] + [cfg.effect for aid, cfg in scenario.actions.items() if aid != "funding"])
+    effect = effects[rng.integers(0, len(effects), size=n)]
+    rain_max = float(rain.max()) * RAIN_PERTURB_HIGH
+    for zid, zp in scenario.params.zones.items():
+        key = (zp.a, zp.b, zp.c)
+        if key in TRAJECTORY_ERRORS:
+            continue
+        s0 = rng.uniform(0.0, zone_storage_max(zp, rain_max), size=n)
+        chained = np.empty((n, k))
+        s = s0
+        for h in range(k):
+            s = SURROGATE.predict_batch(s, rains[:, h], effect if h == 0 else 0.0, zp.a, zp.b, zp.c)
+            chained[:, h] = s
+        error = 0.0
+        for h in range(1, k + 1):
+            pred = TRAJECTORY.predict_batch(s0, rains[:, :h], effect, zp.a, zp.b, zp.c)
+            rel = np.abs(pred - chained[:, :h]) / np.maximum(np.abs(chained[:, :h]), zp.threshold)
+            error = max(error, float(np.percentile(rel, 99)))
+        TRAJECTORY_ERRORS[key] = error
+        if error > TRAJECTORY_MAX_ERROR:
+            logger.warning(
+                f"Trajectory surrogate for {scenario.id}/{zid} exceeds error bound {TRAJECTORY_MAX_ERROR} "
+                f"({error:.4f}); using one-step rollouts."
+            )
+        else:
+            logger.info(f"Trajectory surrogate for {scenario.id}/{zid}: relative error {error:.4f}")
+
+def trajectory_covers(zones: "ZoneArrays", horizon: int) -> bool:
+    """Whether rollouts of `horizon` hours over these zones may use the trajectory surrogate."""
+    if TRAJECTORY is None or not 0 < horizon <= TRAJECTORY.horizon:
+        return False
+    errors = [TRAJECTORY_ERRORS.get(key) for key in zip(zones.a.tolist(), zones.b.tolist(), zones.c.tolist())]
+    return all(e is not None and e <= TRAJECTORY_MAX_ERROR for e in errors)
+
+def ensure_zone_luts(scenario: ScenarioSpec, rain: Sequence[float]) -> None:
+    """Precompute LUTs for a scenario's zones (no-op unless FLOOD_SURROGATE_LUT=1 and the MLP is loaded)."""
+    if not SURROGATE_LUT or SURROGATE is None:
+        return
+    rain_max = max(rain, default=0.0) * RAIN_PERTURB_HIGH * 1.05
+    effects = [cfg.effect for aid, cfg in scenario.actions.items() if aid != "funding"]
+    for zid, zp in scenario.params.zones.items():
+        key = (zp.a, zp.b, zp.c)
+        if key in ZONE_LUTS:
+            continue
+        lut = build_zone_lut(
+            SURROGATE.predict_batch, zp.a, zp.b, zp.c,
+            upper=(zone_storage_max(zp, rain_max), rain_max), effects=effects, max_error=LUT_MAX_ERROR, scale=zp.threshold,
+        )
+        if lut is None:
+            logger.warning(f"LUT for {scenario.id}/{zid} exceeds error bound {LUT_MAX_ERROR}; using MLP.")
+            continue
+        ZONE_LUTS[key] = lut
+        logger.info(
+            f"LUT for {scenario.id}/{zid}: grid {lut.shape} x {len(lut.effects)} effects, "
+            f"max relative error {lut.max_error:.5f}"
+        )
 
 
 # -----------------------------
 # Data models
 # -----------------------------
 
+# Scenario models are frozen: snapshots are shared by every session created from them
 class ActionConfig(BaseModel):
+    model_config = ConfigDict(frozen=True)
     cost: float
     effect: float
 
 class ZoneParams(BaseModel):
+    model_config = ConfigDict(frozen=True)
     a: float  # persistence
     b: float  # rain-to-storage
     c: float  # mitigation strength
@@ -102,10 +359,12 @@ class ZoneParams(BaseModel):
     damage_scale: float
 
 class ScenarioParams(BaseModel):
+    model_config = ConfigDict(frozen=True)
     initial_budget: float
     zones: Dict[str, ZoneParams]
 
 class ScenarioSpec(BaseModel):
+    model_config = ConfigDict(frozen=True)
     id: str
     name: Any
     csv: str
@@ -117,6 +376,8 @@ class ScenarioSpec(BaseModel):
 class StartRequest(BaseModel):
     scenario_id: str
     difficulty: Optional[str] = "standard"
+    advice: bool = True  # False skips forecast/recommendation (fetch them later via /forecast, /recommendation)
+    seed: Optional[int] = Field(None, ge=0, lt=2**32)  # Reproduce an earlier session (random when omitted)
 
 class ZoneState(BaseModel):
     id: str
@@ -138,6 +399,8 @@ class StepRequest(BaseModel):
     game_id: str
     action: str
     zone_id: Optional[str] = None
+    advice: bool = True  # False skips forecast/recommendation (fetch them later via /forecast, /recommendation)
+    idempotency_key: Optional[str] = None  # Retried requests with the same key get the original response
 
 class Observation(BaseModel):
     rain: float
@@ -167,25 +430,162 @@ class StepResponse(BaseModel):
     t: int
     obs: Observation
     state: State
-    forecast: Forecast
-    recommendation: Recommendation
+    forecast: Optional[Forecast] = None  # None when the step was requested without advice
+    recommendation: Optional[Recommendation] = None
     reward: Reward
     events: List[str]
 
 class ReplayResponse(BaseModel):
     scenario_id: str
-    history: List[StepResponse]
+    seed: int
+    total: int  # Responses in the whole episode (t = 0 .. total - 1)
+    start: int
+    end: int  # history holds steps start <= t < end
+    history: List[Dict[str, Any]]  # StepResponse objects, restricted to the requested fields
 
 
 # -----------------------------
 # Core logic
 # -----------------------------
 
+class AdviceState(NamedTuple):
+    """The part of a session its forecast and recommendation depend on (what advice workers receive)."""
+    scenario_id: str
+    scenario_version: str  # ScenarioSnapshot.version the session was created from
+    t: int
+    zone_storage: Tuple[float, ...]  # in scenario zone order
+    budget: float
+    trust: float
+    seed: int
+
+def _advice_job(state: AdviceState) -> Tuple[Forecast, Recommendation]:
+    """Advice worker entry point: rebuild a session from its state vector and compute both results."""
+    snapshot = SCENARIO_REGISTRY.get(state.scenario_version)
+    if snapshot is None:
+        raise ValueError(f"scenario data version {state.scenario_version} is not loaded in this worker")
+    session = GameSession(
+        scenario=snapshot.scenarios[state.scenario_id],
+        rain=snapshot.rainfall[state.scenario_id],
+        rain_cumsum=snapshot.rain_cumsum[state.scenario_id],
+        storage=np.array(state.zone_storage),
+        trust=state.trust,
+        t=state.t,
+        seed=state.seed,
+        scenario_version=state.scenario_version,
+    )
+    session.budget = state.budget
+    return session._make_forecast(horizon=3), session._recommend_action()
+
+def _speculative_advice(session: "GameSession", action_name: str, zone_id: Optional[str]) -> Tuple[Forecast, Recommendation]:
+    """Advance a cloned session by one action and compute the advice a real step would return."""
+    session.step(action_name, zone_id, advice=False)
+    return session.forecast(), session.recommendation()
+
 def sigmoid(x: float) -> float:
     return 1 / (1 + math.exp(-x))
 
+def sigmoid_np(x: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-x))
+
+def cvar(losses: np.ndarray, alpha: float) -> np.ndarray:
+    """CVaR = mean of the worst (1 - alpha) tail along the last axis (at least the single worst loss)."""
+    n = losses.shape[-1]
+    tail_start = min(int(math.floor(alpha * n)), n - 1)
+    # Only the tail has to be separated from the rest, not fully sorted
+    return np.partition(losses, tail_start, axis=-1)[..., tail_start:].mean(axis=-1)
+
+def cvar_gap_se(losses: np.ndarray, best: int, alpha: float, rng: np.random.Generator) -> np.ndarray:
+    """
+    Standard error of CVaR(losses[k]) - CVaR(losses[best]) for every row k of `losses` (candidates, n).
+
+    Uses a paired bootstrap (the same resampled rows for all candidates, exploiting the common random
+    numbers), so one resample serves every comparison. A gap counts as resolved when it exceeds CVAR_Z
+    standard errors, or when CVAR_Z standard errors fall below CVAR_TOLERANCE so further samples could
+    not change the decision meaningfully.
+    """
+    idx = rng.integers(0, losses.shape[1], size=(CVAR_BOOTSTRAP, losses.shape[1]))
+    boot = cvar(losses[:, idx], alpha)
+    return (boot - boot[best]).std(axis=1)
+
+class ZoneArrays(NamedTuple):
+    """Zone parameters as arrays aligned to the scenario's zone order, for vectorized simulation."""
+    ids: Tuple[str, ...]
+    a: np.ndarray
+    b: np.ndarray
+    c: np.ndarray
+    threshold: np.ndarray
+    damage_scale: np.ndarray
+
+def zone_arrays(scenario: ScenarioSpec) -> ZoneArrays:
+    zones = scenario.params.zones
+    ids = tuple(zones)
+    return ZoneArrays(ids, *(np.array([getattr(zones[zid], k) for zid in ids]) for k in ZoneArrays._fields[1:]))
+
+def policy_candidates(scenario: ScenarioSpec) -> List[Tuple[str, Optional[str]]]:
+    """(action, zone) candidates in the fixed order shared by the policy solver and the table lookup."""
+    candidates: List[Tuple[str, Optional[str]]] = []
+    for aid in scenario.actions:
+        if aid in ("none", "funding"):
+            candidates.append((aid, None))
+        else:
+            candidates.extend((aid, zid) for zid in scenario.params.zones)
+    return candidates
+
+def policy_q(
+    scenario: ScenarioSpec,
+    zones: ZoneArrays,
+    rain: List[float],
+    t: int,
+    storages: np.ndarray,
+    budgets: np.ndarray,
+    factors: np.ndarray,
+    alpha: float,
+    next_value,
+    trust: float = POLICY_TRUST,
+) -> np.ndarray:
+    """
+    Risk-sensitive Q-values of one decision step, shape (candidates, len(storages), len(budgets)).
+
+    Transitions follow GameSession.step: the candidate's effect hits its zone (every zone when it has
+    none) under rain[t] scaled by each rain factor, the cost leaves the budget (funding adds its effect
+    instead) and the council grant arrives every 6 hours. Stage losses match the Monte Carlo recommender
+    (cost, +8 when it runs into debt, cost + 10 for funding, plus flood damage). Q is the CVaR over the
+    rain factors of stage loss + next_value(t + 1, next_storages, next_budgets); funding needs budget <= 5.
+    """
+    candidates = policy_candidates(scenario)
+    cfgs = [scenario.actions[aid] for aid, _ in candidates]
+    effects = np.array([[cfg.effect if zid in (None, z) else 0.0 for z in zones.ids] for cfg, (_, zid) in zip(cfgs, candidates)])
+    costs = np.array([float(cfg.cost) for cfg in cfgs])
+    funding = np.array([aid == "funding" for aid, _ in candidates])
+    budgets = np.asarray(budgets, dtype=np.float64)
+    rains = rain[min(t, len(rain) - 1)] * np.asarray(factors, dtype=np.float64)
+
+    # (candidates, factors, storages, zones)
+    nxt = predict_next_storage_batch(
+        np.asarray(storages, dtype=np.float64)[None, None], rains[:, None, None], effects[:, None, None, :], zones.a, zones.b, zones.c
+    )
+    damage = (sigmoid_np(nxt - zones.threshold) * zones.damage_scale).sum(axis=-1)
+    # (candidates, budgets)
+    stage_cost = np.where(funding, costs + 10.0, costs)[:, None] + 8.0 * ((budgets < costs[:, None]) & ~funding[:, None])
+    grant = 5.0 + 15.0 * (trust / 100.0) if (t + 1) % 6 == 0 else 0.0
+    next_budgets = budgets + np.where(funding, [cfg.effect for cfg in cfgs], -costs)[:, None] + grant
+
+    future = next_value(t + 1, nxt[:, :, :, None, :], next_budgets[:, None, None, :])
+    total = damage[..., None] + stage_cost[:, None, None, :] + future
+    q = cvar(np.moveaxis(total, 1, -1), alpha)
+    return np.where(funding[:, None, None] & (budgets > 5.0), np.inf, q)
+
+def policy_table(scenario: ScenarioSpec, rain: List[float]) -> Optional[PolicyTable]:
+    """The loaded table for a scenario if it was solved for exactly these parameters and rain series."""
+    table = POLICIES.get(scenario.id)
+    if table is None:
+        return None
+    if table.fingerprint != scenario_fingerprint(scenario.model_dump(), rain) or list(table.zone_ids) != list(scenario.params.zones):
+        logger.warning(f"Policy table for {scenario.id} is stale (scenario or rain changed); using Monte Carlo.")
+        return None
+    return table
+
 def load_scenarios() -> Dict[str, ScenarioSpec]:
-    # Force re-read from disk
     with PARAM_FILE.open("r", encoding="utf-8") as f:
         data = json.load(f)
     scenarios = {}
@@ -214,71 +614,335 @@ def load_rain_series(filename: str) -> List[float]:
                 values.append(0.0)
     return values
 
-@dataclass
+def rain_arrays(values: Sequence[float]) -> Tuple[np.ndarray, np.ndarray]:
+    """Read-only rain series and its prefix sums (cumsum[i] = rain of hours 0 .. i-1, so cumsum[0] = 0)."""
+    rain = np.array(values, dtype=np.float64)
+    cumsum = np.concatenate(([0.0], np.cumsum(rain)))
+    rain.flags.writeable = False
+    cumsum.flags.writeable = False
+    return rain, cumsum
+
+class ScenarioSnapshot(NamedTuple):
+    """One consistent, read-only load of the scenario definitions and their rainfall series."""
+    version: str  # hash of every scenario's parameters and rain series
+    scenarios: Mapping[str, ScenarioSpec]
+    rainfall: Mapping[str, np.ndarray]  # read-only rain per hour
+    rain_cumsum: Mapping[str, np.ndarray]  # read-only prefix sums, see `rain_arrays`
+    summaries: Tuple[Dict[str, Any], ...]  # /scenarios payload
+
+def build_scenario_snapshot() -> Tuple[ScenarioSnapshot, str, List[Path]]:
+    """
+    Load scenarios and rain series from disk (for SCENARIO_REGISTRY), building zone LUTs and checking the
+    trajectory surrogate for new parameters.
+    """
+    scenarios = load_scenarios()
+    rainfall, rain_cumsum = {}, {}
+    for sid, spec in scenarios.items():
+        rainfall[sid], rain_cumsum[sid] = rain_arrays(load_rain_series(spec.csv))
+    for sid, spec in scenarios.items():
+        ensure_zone_luts(spec, rainfall[sid])
+        check_trajectory(spec, rainfall[sid])
+    fingerprints = {sid: scenario_fingerprint(spec.model_dump(), rainfall[sid]) for sid, spec in scenarios.items()}
+    version = hashlib.sha1(json.dumps(fingerprints, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+    summaries = tuple(
+        {
+            "id": spec.id,
+            "name": spec.name,
+            "description": spec.description,
+            "time_step_hr": spec.time_step_hr,
+            "duration_steps": len(rainfall[sid]),
+            "params": spec.params.model_dump(),
+            "actions": {k: v.model_dump() for k, v in spec.actions.items()},
+        }
+        for sid, spec in scenarios.items()
+    )
+    snapshot = ScenarioSnapshot(
+        version, MappingProxyType(scenarios), MappingProxyType(rainfall), MappingProxyType(rain_cumsum), summaries
+    )
+    return snapshot, version, [PARAM_FILE] + [SCENARIO_DIR / spec.csv for spec in scenarios.values()]
+
+def observation_at(rain: np.ndarray, cumsum: np.ndarray, t: int) -> Observation:
+    """Observation shown with the response for step `t` (the rain of the hour just processed), in O(1)."""
+    # Step index must be clamped to data length
+    idx = max(0, min(t - 1, len(rain) - 1))
+    rain_now = float(rain[idx])
+    start = max(0, idx - 5)
+    rain_6h = float(cumsum[idx + 1] - cumsum[start])
+    accum = float(cumsum[idx + 1])
+    return Observation(rain=rain_now, rain_6h=rain_6h, accum=accum)
+
+def build_state(
+    zone_params: ZoneArrays,
+    storage: np.ndarray,
+    budget: float,
+    trust: float,
+    cooldowns: Dict[str, int],
+    done: bool,
+    game_over: bool,
+    failure_reason: Optional[str],
+) -> State:
+    """Response state from a zone-ordered storage array (the only place ZoneState objects are built)."""
+    risks = sigmoid_np(storage - zone_params.threshold)
+    zones = {}
+    for zid, zone_storage, risk in zip(zone_params.ids, storage.tolist(), risks.tolist()):
+        zones[zid] = ZoneState(
+            id=zid,
+            name=zid.capitalize(),
+            storage=zone_storage,
+            risk=risk,
+            flooded=risk > 0.8
+        )
+    return State(
+        zones=zones,
+        budget=budget,
+        trust=round(max(trust, 0), 1),
+        cooldowns=cooldowns,
+        done=done,
+        game_over=game_over,
+        failure_reason=failure_reason
+    )
+
+def event_texts(scenario: ScenarioSpec, mask: int, trust: float) -> List[str]:
+    """Event messages for a step's event bitmask (`trust` is the raw trust after the step, shown with the grant)."""
+    events = []
+    if mask & EVENT_FUNDING:
+        cfg = scenario.actions["funding"]
+        events.append(f"Emergency Funding: +${cfg.effect:.1f} (Penalty: -{cfg.cost} Trust)")
+    for i, zid in enumerate(scenario.params.zones):
+        if mask & (1 << (EVENT_CRITICAL_SHIFT + i)):
+            events.append(f"CRITICAL FLOODING in {zid.capitalize()}!")
+    if mask & EVENT_GRANT:
+        grant = 5.0 + (15.0 * (trust / 100.0))
+        events.append(f"City Council Grant: +${grant:.1f} (Trust: {trust}%)")
+    if mask & EVENT_REMOVED:
+        events.append("COMMANDER REMOVED!")
+    return events
+
+@dataclass(slots=True)
 class GameSession:
+    """
+    One game. Core state is kept as arrays in the scenario's zone and action order (`storage`, `cooldowns`,
+    with zone parameters in `_zones`), so a step is a few vector ops; the pydantic State / ZoneState objects
+    are only built for responses.
+    """
     scenario: ScenarioSpec
-    rain: List[float]
-    zone_storage: Dict[str, float] = field(default_factory=dict)
+    rain: np.ndarray  # read-only, shared with the scenario snapshot (other sequences are converted)
+    rain_cumsum: Optional[np.ndarray] = field(default=None, repr=False)  # prefix sums (computed when omitted)
+    storage: Optional[np.ndarray] = None  # per-zone storage (zeros when omitted)
     budget: float = 0.0
     trust: float = 100.0
-    cooldowns: Dict[str, int] = field(default_factory=dict)
+    cooldowns: Optional[np.ndarray] = None  # per-action cooldown steps (zeros when omitted)
     t: int = 0
     total_reward: float = 0.0
-    history: List[StepResponse] = field(default_factory=list)
     is_game_over: bool = False
     failure_reason: Optional[str] = None
+    # Every random draw comes from generators seeded by (seed, t), so the action log replays the session exactly
+    seed: int = field(default_factory=lambda: secrets.randbits(32))
+    action_log: List[Tuple[str, Optional[str]]] = field(default_factory=list)
+    last_response: Optional[StepResponse] = None
+    # ScenarioSnapshot the scenario and rain came from; the session keeps them across scenario reloads
+    scenario_version: str = ""
+    # Bumped by every step; external stores only write a session back over the version it was read at
+    version: int = 0
+    # Idempotency key -> t of the response it produced (most recent MAX_STEP_KEYS)
+    step_keys: Dict[str, int] = field(default_factory=dict)
+    # Held while a request reads or mutates this session; other sessions are not blocked
+    lock: threading.RLock = field(default_factory=threading.RLock, init=False, repr=False, compare=False)
+    _zones: ZoneArrays = field(init=False, repr=False)
+    _actions: Tuple[str, ...] = field(init=False, repr=False)
+    # Common random numbers: one rain-perturbation matrix per step, shared by forecast and all candidates
+    _factors: Optional[np.ndarray] = field(default=None, init=False, repr=False)
+    _factors_t: int = field(default=-1, init=False, repr=False)
+    _sampler: Optional[RainSampler] = field(default=None, init=False, repr=False)
+    # On-demand advice, cached as (t, value) so repeated requests for the same step are free
+    _forecast_cache: Optional[Tuple[int, Forecast]] = field(default=None, init=False, repr=False)
+    _recommendation_cache: Optional[Tuple[int, Recommendation]] = field(default=None, init=False, repr=False)
+    # Speculative advice for the next step, keyed by (t, action, zone) of the action that would be taken
+    _speculative: Dict[Tuple[int, str, Optional[str]], Future] = field(default_factory=dict, init=False, repr=False)
+    _policy: Optional[PolicyTable] = field(default=None, init=False, repr=False)
+    # Columnar record of every response so far, for /replay; None for clones and sessions restored from a store
+    history: Optional[EpisodeHistory] = field(default=None, init=False, repr=False)
 
     def __post_init__(self):
-        if not self.zone_storage:
-            self.zone_storage = {zid: 0.0 for zid in self.scenario.params.zones}
-        if not self.cooldowns:
-            self.cooldowns = {aid: 0 for aid in self.scenario.actions}
+        if self.rain_cumsum is None:
+            self.rain, self.rain_cumsum = rain_arrays(self.rain)
+        self._zones = zone_arrays(self.scenario)
+        self._actions = tuple(self.scenario.actions)
+        n_zones, n_actions = len(self._zones.ids), len(self._actions)
+        self.storage = np.zeros(n_zones) if self.storage is None else np.array(self.storage, dtype=np.float64)
+        self.cooldowns = np.zeros(n_actions, dtype=np.int32) if self.cooldowns is None else np.array(self.cooldowns, dtype=np.int32)
         if self.budget == 0.0:
             self.budget = self.scenario.params.initial_budget
+        if POLICY_MODE:
+            self._policy = policy_table(self.scenario, self.rain)
+        self.history = EpisodeHistory(len(self.rain) + 1, n_zones, n_actions)
         logger.info(f"Session initialized. Rain length: {len(self.rain)}")
 
     def current_obs(self) -> Observation:
-        # Step index must be clamped to data length
-        idx = max(0, min(self.t - 1, len(self.rain) - 1))
-        rain_now = self.rain[idx]
-        start = max(0, idx - 5)
-        rain_6h = sum(self.rain[start : idx + 1])
-        accum = sum(self.rain[: idx + 1])
-        return Observation(rain=rain_now, rain_6h=rain_6h, accum=accum)
+        return observation_at(self.rain, self.rain_cumsum, self.t)
 
     def get_state(self) -> State:
-        zones = {}
-        for zid, storage in self.zone_storage.items():
-            params = self.scenario.params.zones[zid]
-            risk = sigmoid(storage - params.threshold)
-            zones[zid] = ZoneState(
-                id=zid,
-                name=zid.capitalize(),
-                storage=storage,
-                risk=risk,
-                flooded=risk > 0.8
-            )
         # Done means all 24 hours (0-23) have been processed
-        is_done = self.t >= len(self.rain)
-        return State(
-            zones=zones,
-            budget=self.budget,
-            trust=round(max(self.trust, 0), 1),
-            cooldowns=self.cooldowns,
-            done=is_done,
+        return build_state(
+            self._zones,
+            self.storage,
+            self.budget,
+            self.trust,
+            dict(zip(self._actions, self.cooldowns.tolist())),
+            done=self.t >= len(self.rain),
             game_over=self.is_game_over,
-            failure_reason=self.failure_reason
+            failure_reason=self.failure_reason,
         )
 
-    def step(self, action_name: str, zone_id: Optional[str] = None) -> StepResponse:
+    def forecast(self) -> Forecast:
+        """Forecast for the current `t`, computed on first request and cached for the step."""
+        if self._forecast_cache is None or self._forecast_cache[0] != self.t:
+            if not self._pooled_advice():
+                self._forecast_cache = (self.t, self._make_forecast(horizon=3))
+                self._attach_advice(forecast=self._forecast_cache[1])
+        return self._forecast_cache[1]
+
+    def recommendation(self) -> Recommendation:
+        """Recommendation for the current `t`, computed on first request and cached for the step."""
+        if self._recommendation_cache is None or self._recommendation_cache[0] != self.t:
+            if not self._pooled_advice():
+                self._recommendation_cache = (self.t, self._recommend_action())
+                self._attach_advice(recommendation=self._recommendation_cache[1])
+        return self._recommendation_cache[1]
+
+    def advice_state(self) -> AdviceState:
+        """Small picklable state vector for computing this step's advice in another process."""
+        return AdviceState(
+            scenario_id=self.scenario.id,
+            scenario_version=self.scenario_version,
+            t=self.t,
+            zone_storage=tuple(self.storage.tolist()),
+            budget=self.budget,
+            trust=self.trust,
+            seed=self.seed,
+        )
+
+    def _pooled_advice(self) -> bool:
+        """Compute and cache forecast and recommendation together in the advice pool; False if not used or failed."""
+        pool = advice_pool()
+        if pool is None:
+            return False
+        try:
+            forecast, recommendation = pool.submit(_advice_job, self.advice_state()).result()
+        except Exception as e:
+            logger.warning(f"Advice worker failed, computing in-process: {e}")
+            return False
+        self._forecast_cache = (self.t, forecast)
+        self._recommendation_cache = (self.t, recommendation)
+        self._attach_advice(forecast=forecast, recommendation=recommendation)
+        return True
+
+    def _attach_advice(self, **advice) -> None:
+        """Fill advice computed after the fact into the latest response (returned again once the game is closed) and its history row."""
+        if self.last_response is not None and self.last_response.t == self.t:
+            for key, value in advice.items():
+                if getattr(self.last_response, key) is None:
+                    setattr(self.last_response, key, value)
+        if self.history is not None and self.history.rows > self.t:
+            forecast, rec = advice.get("forecast"), advice.get("recommendation")
+            if forecast is not None:
+                self.history.record_forecast(self.t, forecast.risk_mean, forecast.risk_std, forecast.prob_critical)
+            if rec is not None:
+                self.history.record_recommendation(
+                    self.t, rec.action, rec.zone_id, rec.reason, rec.top_reasons, rec.expected_loss, rec.confidence
+                )
+
+    def _record(self, response: StepResponse, events: int) -> None:
+        """Append a response to the columnar history (its advice is recorded by `_attach_advice`)."""
+        if self.history is None:
+            return
+        self.history.record(
+            response.t,
+            response.action,
+            response.zone_id,
+            self.storage,
+            self.budget,
+            self.trust,
+            response.reward.delta,
+            response.reward.total,
+            self.cooldowns,
+            events,
+        )
+        self._attach_advice(forecast=response.forecast, recommendation=response.recommendation)
+
+    def _clone(self) -> "GameSession":
+        """Copy of the game state without action log, rain samples or cached advice (for speculative lookahead)."""
+        clone = copy.copy(self)
+        clone.storage = self.storage.copy()
+        clone.cooldowns = self.cooldowns.copy()
+        clone.action_log, clone.last_response, clone.history = [], None, None
+        clone.step_keys, clone.lock = {}, threading.RLock()
+        clone._factors, clone._factors_t, clone._sampler = None, -1, None
+        clone._forecast_cache = clone._recommendation_cache = None
+        clone._speculative = {}
+        return clone
+
+    def speculate(self, advice: bool = True) -> None:
+        """
+        Queue advice for the likeliest next actions on SPECULATION_POOL (no-op when speculation is off, or
+        for `advice=False` requests, whose clients fetch advice on demand if at all).
+        """
+        if SPECULATION_POOL is None or not advice or self.is_game_over or self.t >= len(self.rain):
+            return
+        if not isinstance(SESSIONS, MemorySessionStore):
+            return  # external stores hand out a fresh copy per request, so nothing would pick the results up
+        likely: List[Tuple[str, Optional[str]]] = []
+        if self._recommendation_cache is not None and self._recommendation_cache[0] == self.t:
+            rec = self._recommendation_cache[1]
+            likely.append((rec.action, rec.zone_id))
+        likely.append(("none", None))
+        if self.action_log:
+            likely.append(self.action_log[-1])
+        for action_name, zone_id in dict.fromkeys(likely):
+            key = (self.t, action_name, zone_id)
+            if action_name in self.scenario.actions and key not in self._speculative:
+                self._speculative[key] = SPECULATION_POOL.submit(_speculative_advice, self._clone(), action_name, zone_id)
+                count_speculation("submitted")
+
+    def _take_speculation(self, action_name: str, zone_id: Optional[str]) -> Optional[Future]:
+        """Pop the speculation matching the action about to be taken and cancel the others."""
+        pending = self._speculative.pop((self.t, action_name, zone_id), None)
+        for future in self._speculative.values():
+            future.cancel()
+        self._speculative.clear()
+        return pending
+
+    def keyed_response(self, idempotency_key: Optional[str], advice: bool = True) -> Optional[StepResponse]:
+        """The response an earlier step with this idempotency key produced, or None for new keys."""
+        t = self.step_keys.get(idempotency_key) if idempotency_key else None
+        if t is None:
+            return None
+        if self.last_response is not None and self.last_response.t == t:
+            return self.last_response
+        return next(self.iter_history(t, t + 1, advice=advice))
+
+    def step(self, action_name: str, zone_id: Optional[str] = None, advice: bool = True, idempotency_key: Optional[str] = None) -> StepResponse:
         logger.info(f"--- STEP START: T={self.t} ---")
         
         if self.is_game_over or self.t >= len(self.rain):
             logger.info("Session already closed.")
-            return self.history[-1]
+            if self.last_response is None:
+                # Restored from an external store, which doesn't keep responses
+                self.last_response = next(self.iter_replay(self.t, self.t + 1))
+            return self.last_response
 
         if action_name not in self.scenario.actions:
             raise HTTPException(status_code=400, detail=f"Unknown action: {action_name}")
+        if zone_id is not None and zone_id not in self.scenario.params.zones:
+            raise HTTPException(status_code=400, detail=f"Unknown zone: {zone_id}")
+
+        pending = self._take_speculation(action_name, zone_id)
+        self.action_log.append((action_name, zone_id))
+        self.version += 1
+        if idempotency_key:
+            self.step_keys[idempotency_key] = self.t + 1
+            while len(self.step_keys) > MAX_STEP_KEYS:
+                del self.step_keys[next(iter(self.step_keys))]
 
         action_cfg = self.scenario.actions[action_name]
         
@@ -288,14 +952,14 @@ class GameSession:
         if action_name not in ["none", "funding"] and zone_id is None:
             final_cost = action_cfg.cost * 2.5 # 2.5x cost for covering all 3 zones
             
-        events = []
+        events = 0  # EVENT_* bitmask
         
         # Special handling for "funding" action if it exists
         if action_name == "funding":
             # This is a special action: gain budget, lose trust
             self.budget += action_cfg.effect # Use effect as budget gain
             self.trust -= final_cost    # Use cost as trust penalty
-            events.append(f"Emergency Funding: +${action_cfg.effect:.1f} (Penalty: -{final_cost} Trust)")
+            events |= EVENT_FUNDING
         else:
             # Normal action: apply cost to budget
             if self.budget < final_cost:
@@ -305,21 +969,15 @@ class GameSession:
         # Current rain for this step
         rain_now = self.rain[self.t]
         
-        step_damage = 0.0
-        for zid, storage in self.zone_storage.items():
-            z_params = self.scenario.params.zones[zid]
-            effect = action_cfg.effect if (zone_id == zid or zone_id is None) else 0.0
-            
-            # Storage formula (using ML surrogate)
-            new_storage = predict_next_storage(storage, rain_now, effect, z_params)
-            self.zone_storage[zid] = new_storage
-            
-            risk = sigmoid(new_storage - z_params.threshold)
-            step_damage += risk * z_params.damage_scale
-            
-            if risk > 0.85:
-                self.trust -= 5.0 # Reduced per-step penalty to prevent instant kill
-                events.append(f"CRITICAL FLOODING in {zid.capitalize()}!")
+        # Storage formula (using ML surrogate), all zones at once
+        z = self._zones
+        effects = self._candidate_effects(action_cfg, zone_id)
+        self.storage = np.asarray(predict_next_storage_batch(self.storage, rain_now, effects, z.a, z.b, z.c), dtype=np.float64)
+        risk = sigmoid_np(self.storage - z.threshold)
+        step_damage = float(risk @ z.damage_scale)
+        for i in np.flatnonzero(risk > 0.85).tolist():
+            self.trust -= 5.0 # Reduced per-step penalty to prevent instant kill
+            events |= 1 << (EVENT_CRITICAL_SHIFT + i)
         
         # Reward
         reward_delta = -step_damage - final_cost
@@ -333,16 +991,29 @@ class GameSession:
             # Base grant + bonus based on trust
             grant = 5.0 + (15.0 * (self.trust / 100.0))
             self.budget += grant
-            events.append(f"City Council Grant: +${grant:.1f} (Trust: {self.trust}%)")
+            events |= EVENT_GRANT
         
         # Check death
         if self.trust <= 0:
             self.is_game_over = True
             self.failure_reason = "PUBLIC_OUTRAGE"
-            events.append("COMMANDER REMOVED!")
-
-        forecast = self._make_forecast(horizon=3)
-        recommendation = self._recommend_action()
+            events |= EVENT_REMOVED
+
+        if pending is not None and not pending.done() and not (advice and pending.running()):
+            # Still queued behind other sessions' jobs (or its advice isn't wanted): don't make this step wait
+            pending.cancel()
+            count_speculation("cancelled")
+            pending = None
+        if pending is not None:
+            try:
+                forecast, recommendation = pending.result()
+            except Exception as e:
+                logger.warning(f"Speculative advice failed, recomputing: {e}")
+            else:
+                self._forecast_cache = (self.t, forecast)
+                self._recommendation_cache = (self.t, recommendation)
+        if advice and SPECULATION_POOL is not None:
+            count_speculation("hits" if self._recommendation_cache is not None and self._recommendation_cache[0] == self.t else "misses")
 
         response = StepResponse(
             action=action_name,
@@ -350,63 +1021,247 @@ class GameSession:
             t=self.t, # This will be 1, 2, 3... 24
             obs=self.current_obs(),
             state=self.get_state(),
-            forecast=forecast,
-            recommendation=recommendation,
+            forecast=self.forecast() if advice else None,
+            recommendation=self.recommendation() if advice else None,
             reward=Reward(delta=reward_delta, total=self.total_reward),
-            events=list(set(events))
+            events=event_texts(self.scenario, events, self.trust)
         )
         
-        self.history.append(response)
+        self.last_response = response
+        self._record(response, events)
         logger.info(f"--- STEP END: New T={self.t}, Done={response.state.done} ---")
         return response
 
-    def _initial_response(self) -> StepResponse:
+    def _initial_response(self, advice: bool = True) -> StepResponse:
         # For initial t=0, we don't have obs yet, or we show t=0 obs
         # Let's say t=0 is the state before any rain is processed
-        return StepResponse(
+        response = StepResponse(
             action="none",
             t=0,
             obs=Observation(rain=0, rain_6h=0, accum=0),
             state=self.get_state(),
-            forecast=self._make_forecast(horizon=3),
-            recommendation=self._recommend_action(),
+            forecast=self.forecast() if advice else None,
+            recommendation=self.recommendation() if advice else None,
             reward=Reward(delta=0.0, total=0.0),
             events=[]
         )
+        self._record(response, 0)
+        return response
 
-    def _make_forecast(self, horizon: int = 3) -> Forecast:
-        samples = 15
-        means: List[float] = []
-        stds: List[float] = []
-        probs: List[float] = []
-        
-        for h in range(1, horizon + 1):
-            risks = []
-            idx = min(self.t + h - 1, len(self.rain) - 1)
-            base_rain = self.rain[idx]
-
-            for _ in range(samples):
-                # Wider perturbation for more dynamic movement
-                perturbed_rain = base_rain * random.uniform(0.6, 1.4)
-                step_total_risk = 0.0
-                for zid, storage in self.zone_storage.items():
-                    zp = self.scenario.params.zones[zid]
-                    sim_s = predict_next_storage(storage, perturbed_rain, 0.0, zp)
-                    risk = sigmoid(sim_s - zp.threshold)
-                    step_total_risk += risk
-                risks.append(step_total_risk / len(self.zone_storage))
-            
-            m = sum(risks) / len(risks)
-            v = sum((r - m)**2 for r in risks) / len(risks)
-            s = math.sqrt(max(v, 0))
-            
-            means.append(float(round(m, 4)))
-            stds.append(float(round(s, 4)))
-            # Significant risk probability: sensitive to even moderate increases
-            p_sig = len([r for r in risks if r > 0.3]) / len(risks)
-            probs.append(float(round(p_sig, 4)))
-            
-        return Forecast(risk_mean=means, risk_std=stds, prob_critical=probs)
+    def approx_bytes(self) -> int:
+        """Rough memory footprint, for the session store's byte budget."""
+        factors = self._factors.nbytes if self._factors is not None else 0
+        history = self.history.nbytes if self.history is not None else 0
+        return SESSION_BASE_BYTES + 64 * len(self.action_log) + factors + history
+
+    def iter_replay(self, start: int, end: int, advice: bool = True) -> Iterator[StepResponse]:
+        """
+        Responses for steps start <= t < end, rebuilt by replaying the action log from the seed. Steps
+        before `start` are replayed without advice: draws are seeded by (seed, t), so that changes nothing.
+        """
+        session = GameSession(
+            scenario=self.scenario, rain=self.rain, rain_cumsum=self.rain_cumsum, seed=self.seed,
+            scenario_version=self.scenario_version,
+        )
+        session.history = None
+        initial = session._initial_response(advice=advice and start == 0 < end)
+        if start == 0 and end > 0:
+            yield initial
+        for action_name, zone_id in self.action_log[: max(end - 1, 0)]:
+            in_range = session.t + 1 >= start
+            response = session.step(action_name, zone_id, advice=advice and in_range)
+            if in_range:
+                yield response
+
+    def has_recorded(self, start: int, end: int, advice: bool = True) -> bool:
+        """
+        Whether the columnar history can serve steps start <= t < end: it is kept and complete, and
+        (when advice is asked for) every step in range had its forecast and recommendation computed.
+        """
+        h = self.history
+        if h is None or h.rows != self.t + 1:
+            return False
+        return not advice or not ((h.forecast_len[start:end] < 0).any() or (h.rec[start:end] < 0).any())
+
+    def iter_recorded(self, start: int, end: int, advice: bool = True) -> Iterator[StepResponse]:
+        """Responses for steps start <= t < end materialized from the columnar history (see `has_recorded`)."""
+        h = self.history
+        for t in range(start, min(end, h.rows)):
+            action_name, zone_id = h.values[int(h.action[t])]
+            mask = int(h.events[t])
+            game_over = bool(mask & EVENT_REMOVED)
+            forecast = recommendation = None
+            if advice:
+                n = int(h.forecast_len[t])
+                forecast = Forecast(
+                    risk_mean=h.forecast[t, 0, :n].tolist(),
+                    risk_std=h.forecast[t, 1, :n].tolist(),
+                    prob_critical=h.forecast[t, 2, :n].tolist(),
+                )
+                rec_action, rec_zone, reason, top_reasons = h.values[int(h.rec[t])]
+                recommendation = Recommendation(
+                    action=rec_action,
+                    zone_id=rec_zone,
+                    reason=reason,
+                    expected_loss=float(h.rec_loss[t]),
+                    confidence=float(h.rec_confidence[t]),
+                    top_reasons=list(top_reasons),
+                )
+            trust = float(h.trust[t])
+            yield StepResponse(
+                action=action_name,
+                zone_id=zone_id,
+                t=t,
+                obs=observation_at(self.rain, self.rain_cumsum, t) if t > 0 else Observation(rain=0, rain_6h=0, accum=0),
+                state=build_state(
+                    self._zones,
+                    h.storage[t],
+                    float(h.budget[t]),
+                    trust,
+                    dict(zip(self._actions, h.cooldowns[t].tolist())),
+                    done=t >= len(self.rain),
+                    game_over=game_over,
+                    failure_reason="PUBLIC_OUTRAGE" if game_over else None,
+                ),
+                forecast=forecast,
+                recommendation=recommendation,
+                reward=Reward(delta=float(h.reward[t]), total=float(h.total_reward[t])),
+                events=event_texts(self.scenario, mask, trust),
+            )
+
+    def iter_history(self, start: int, end: int, advice: bool = True) -> Iterator[StepResponse]:
+        """Responses for steps start <= t < end, from the columnar history when it can serve them."""
+        if self.has_recorded(start, end, advice=advice):
+            return self.iter_recorded(start, end, advice=advice)
+        return self.iter_replay(start, end, advice=advice)
+
+    def _step_rng(self, stream: int) -> np.random.Generator:
+        """Generator for one purpose (`stream`) at the current step; identical for every replay of the session."""
+        return np.random.default_rng([self.seed, self.t, stream])
+
+    def _rain_factors(self, n_samples: int, horizon: int) -> np.ndarray:
+        """
+        Rain perturbation factors for the current step, shape (n_samples, horizon).
+
+        Drawn once per `t` and shared by the forecast and every candidate rollout (common random
+        numbers), so candidate CVaR differences reflect the actions rather than sampling noise.
+        Rows are drawn FACTOR_BLOCK at a time and callers get a prefix, so the matrix is the same whatever
+        the order and size of the requests; a request past the block appends another whole block. Rows are
+        only redrawn for a new step or a longer horizon.
+        """
+        factors = self._factors
+        if factors is None or self._factors_t != self.t or factors.shape[1] < horizon:
+            factors = np.empty((0, horizon))
+            self._factors_t = self.t
+            self._sampler = RainSampler(SAMPLING_METHOD, horizon, self._step_rng(0))
+        if factors.shape[0] < n_samples:
+            blocks = -(-(n_samples - factors.shape[0]) // FACTOR_BLOCK)
+            u = np.vstack([self._sampler.draw(FACTOR_BLOCK) for _ in range(blocks)])
+            factors = np.vstack([factors, RAIN_PERTURB_LOW + (RAIN_PERTURB_HIGH - RAIN_PERTURB_LOW) * u])
+        self._factors = factors
+        return factors[:n_samples, :horizon]
+
+    def _make_forecast(self, horizon: int = 3, samples: Optional[int] = None, carry: Optional[bool] = None) -> Forecast:
+        """
+        Vectorized Monte Carlo forecast of zone-averaged risk for the next `horizon` hours.
+
+        Builds the whole (samples, horizon, zones) storage tensor with batched surrogate calls and reduces
+        it with array ops. Without `carry`, every hour is projected from the current storage (the original
+        behaviour); with `carry`, each sample's storage evolves through the horizon. With the surrogate
+        ensemble loaded, each member adds its deviation from the members' mean to the serving engine's
+        prediction; members form a leading axis and count as extra samples.
+        """
+        samples = FORECAST_SAMPLES if samples is None else samples
+        carry = FORECAST_CARRY if carry is None else carry
+        if horizon <= 0 or samples <= 0:
+            return Forecast(risk_mean=[], risk_std=[], prob_critical=[])
+
+        z = self._zones
+        s0 = self.storage
+        idx = np.minimum(np.arange(self.t, self.t + horizon), len(self.rain) - 1)
+        # Wider perturbation for more dynamic movement; (samples, horizon, 1) broadcasts over zones
+        rains = (self.rain[idx] * self._rain_factors(samples, horizon))[..., None]
+
+        if not carry:
+            storages = predict_next_storage_batch(s0, rains, 0.0, z.a, z.b, z.c)
+            if ENSEMBLE is not None:
+                # The members only contribute their spread; the prediction stays the serving engine's
+                members = ENSEMBLE.predict_members(s0, rains, 0.0, z.a, z.b, z.c)
+                storages = np.maximum(storages + (members - members.mean(axis=0)), 0.0)
+        elif ENSEMBLE is not None:
+            # Each member carries its own storage, (members, samples, zones) per hour, and steps it with the
+            # serving engine plus its deviation from the members' mean at that storage
+            n = ENSEMBLE.n_members
+            s = np.broadcast_to(s0, (n, samples, len(z.ids)))
+            steps = []
+            for h in range(horizon):
+                # (members, carried storages, samples, zones): every member at every member's storage
+                members = ENSEMBLE.predict_members(s, rains[None, :, h], 0.0, z.a, z.b, z.c)
+                own = members[np.arange(n), np.arange(n)]
+                s = predict_next_storage_batch(s, rains[None, :, h], 0.0, z.a, z.b, z.c)
+                s = np.maximum(s + (own - members.mean(axis=0)), 0.0)
+                steps.append(s)
+            storages = np.stack(steps, axis=2)
+        elif trajectory_covers(z, horizon):
+            # (samples, zones, horizon) in one pass -> (samples, horizon, zones)
+            storages = TRAJECTORY.predict_batch(s0, rains[..., 0][:, None, :], 0.0, z.a, z.b, z.c).transpose(0, 2, 1)
+        else:
+            s = np.broadcast_to(s0, (samples, len(z.ids)))
+            steps = []
+            for h in range(horizon):
+                s = predict_next_storage_batch(s, rains[:, h], 0.0, z.a, z.b, z.c)
+                steps.append(s)
+            storages = np.stack(steps, axis=1)
+
+        # Zone-averaged risk per (sample, hour); ensemble members are folded into the sample axis
+        risks = sigmoid_np(storages - z.threshold).mean(axis=-1).reshape(-1, horizon)
+        means = risks.mean(axis=0)
+        stds = risks.std(axis=0)
+        # Significant risk probability: sensitive to even moderate increases
+        probs = (risks > 0.3).mean(axis=0)
+        return Forecast(
+            risk_mean=[round(float(v), 4) for v in means],
+            risk_std=[round(float(v), 4) for v in stds],
+            prob_critical=[round(float(v), 4) for v in probs],
+        )
+
+    def _evaluate_candidates(self, effects: np.ndarray, costs: np.ndarray, factors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Roll out every candidate action at once, one rollout per row of rain factors.
+
+        `effects` is (candidates, zones): the mitigation each candidate applies now (first hour only, no
+        further mitigation afterwards); `costs` is (candidates,). The storage tensor is
+        candidates x samples x zones per hour (or candidates x samples x zones x horizon in one pass with the
+        trajectory surrogate). Returns (losses, zone_damage) with shapes (candidates, n) and
+        (candidates, n, zones); a loss is the action cost plus damage summed over the horizon.
+        """
+        n, horizon = factors.shape
+        z = self._zones
+        s0 = self.storage
+        # Base index is "now" (same as recommendation logic previously)
+        base_idx = min(self.t, len(self.rain) - 1)
+        base_rain = self.rain[np.minimum(np.arange(base_idx, base_idx + horizon), len(self.rain) - 1)]
+        # Uncertainty: allow wider perturbation to model bursty storms (shared per-step draws), (samples, horizon)
+        rains = base_rain * factors
+
+        if trajectory_covers(z, horizon):
+            # (1, n, 1, horizon) rain x (C, 1, zones) effects -> storages (C, n, zones, horizon)
+            storages = TRAJECTORY.predict_batch(s0, rains[None, :, None, :], effects[:, None, :], z.a, z.b, z.c)
+            zone_damage = (sigmoid_np(storages - z.threshold[:, None]) * z.damage_scale[:, None]).sum(axis=-1)
+        else:
+            storages = np.broadcast_to(s0, (effects.shape[0], n, len(z.ids)))
+            zone_damage = np.zeros(storages.shape)
+            for h in range(horizon):
+                # Apply mitigation only on the first simulated hour (the action we are choosing now)
+                effect = effects[:, None, :] if h == 0 else 0.0
+                storages = predict_next_storage_batch(storages, rains[None, :, h, None], effect, z.a, z.b, z.c)
+                zone_damage += sigmoid_np(storages - z.threshold) * z.damage_scale
+
+        return costs[:, None] + zone_damage.sum(axis=-1), zone_damage
+
+    def _candidate_effects(self, first_action: ActionConfig, first_zone: Optional[str]) -> np.ndarray:
+        """Per-zone effect of applying an action to one zone (or all zones when `first_zone` is None)."""
+        return np.array([first_action.effect if (first_zone is None or first_zone == zid) else 0.0 for zid in self._zones.ids])
 
     def _simulate_cvar_rollout(
         self,
@@ -430,64 +1285,69 @@ class GameSession:
 
         # Clamp alpha for safety
         alpha = float(min(max(alpha, 0.0), 0.999))
-        losses: List[float] = []
-        zone_damage_sum: Dict[str, float] = {zid: 0.0 for zid in self.zone_storage}
-
-        # Base index is "now" (same as recommendation logic previously)
-        base_idx = min(self.t, len(self.rain) - 1)
-
-        for _ in range(n_samples):
-            # Copy current storages for simulation
-            storages = dict(self.zone_storage)
-            total_damage = 0.0
-            per_zone_damage = {zid: 0.0 for zid in storages}
-
-            for h in range(horizon):
-                idx = min(base_idx + h, len(self.rain) - 1)
-                base_rain = self.rain[idx]
-                # Uncertainty: allow wider perturbation to model bursty storms
-                rain_h = base_rain * random.uniform(0.6, 1.4)
-
-                for zid, s in list(storages.items()):
-                    zp = self.scenario.params.zones[zid]
-                    # Apply mitigation only on the first simulated hour (the action we are choosing now)
-                    effect = 0.0
-                    if h == 0:
-                        if first_zone is None or first_zone == zid:
-                            effect = first_action.effect
-
-                    s_next = predict_next_storage(s, rain_h, effect, zp)
-                    storages[zid] = s_next
-                    risk = sigmoid(s_next - zp.threshold)
-                    dmg = risk * zp.damage_scale
-                    total_damage += dmg
-                    per_zone_damage[zid] += dmg
-
-            # Include action cost with correct scaling for "all zones"
-            action_cost = float(first_action.cost)
-            if first_zone is None:
-                # Only mitigation actions should be evaluated here; scaling is handled outside
-                # but we keep a defensive rule in case the caller forgot.
-                action_cost = float(first_action.cost)
-
-            losses.append(action_cost + total_damage)
-            for zid, dmg in per_zone_damage.items():
-                zone_damage_sum[zid] += dmg
-
-        losses.sort()
-        mean_loss = float(sum(losses) / len(losses)) if losses else 0.0
-
-        # CVaR = mean of worst (1-alpha) tail
-        if not losses:
-            cvar = 0.0
-        else:
-            tail_start = int(math.floor(alpha * len(losses)))
-            tail = losses[tail_start:] if tail_start < len(losses) else [losses[-1]]
-            cvar = float(sum(tail) / len(tail))
-
+        losses, zone_damage = self._evaluate_candidates(
+            self._candidate_effects(first_action, first_zone)[None, :],
+            np.array([float(first_action.cost)]),
+            self._rain_factors(n_samples, horizon),
+        )
+        losses = np.sort(losses[0])
         # Average per-zone damage contribution (for XAI)
-        mean_zone_damage = {zid: (zone_damage_sum[zid] / max(1, n_samples)) for zid in zone_damage_sum}
-        return cvar, mean_loss, losses, mean_zone_damage
+        mean_zone_damage = dict(zip(self._zones.ids, zone_damage[0].mean(axis=0).tolist()))
+        return float(cvar(losses, alpha)), float(losses.mean()), losses.tolist(), mean_zone_damage
+
+    def _policy_recommendation(self) -> Optional[Recommendation]:
+        """Recommendation by one-step lookahead on the precomputed value table; None outside the table."""
+        table = self._policy
+        storages = self.storage
+        if table is None or not table.contains(self.t, storages, self.budget):
+            return None
+        q = policy_q(
+            self.scenario, self._zones, self.rain, self.t, storages[None, :], np.array([self.budget]),
+            table.factors, table.alpha, table.value_at, trust=self.trust,
+        )[:, 0, 0]
+        candidates = policy_candidates(self.scenario)
+        if self.trust <= 15.0:
+            q = np.where([aid == "funding" for aid, _ in candidates], np.inf, q)
+        order = np.argsort(q, kind="stable")
+        best = int(order[0])
+        best_action, best_zone = candidates[best]
+        # Confidence: higher when the runner-up is clearly worse
+        gap = float(q[order[1]] - q[best]) if len(order) > 1 and np.isfinite(q[order[1]]) else abs(float(q[best]))
+        conf_val = float(min(0.99, max(0.6, 0.6 + gap / (abs(float(q[best])) + 1e-6))))
+
+        risk = sigmoid_np(storages - self._zones.threshold) * self._zones.damage_scale
+        worst_zone = self._zones.ids[int(np.argmax(risk))] if risk.max() > 0 else None
+        t_zh = {"industrial": "工業區", "residential": "住宅區", "lowland": "低窪區"}
+        zone_label = t_zh.get(best_zone, "") if best_zone else ""
+        worst_zone_label = t_zh.get(worst_zone, "") if worst_zone else ""
+        affordable = self.budget >= self.scenario.actions[best_action].cost
+        reasons = {
+            "zh": {
+                "summary": f"依預先計算的策略表（CVaR，最差20%）評估暴雨剩餘 {table.horizon - self.t} 小時，選擇累積尾端損失最低的行動。",
+                "chosen_action": f"建議：{best_action} {zone_label}".strip(),
+                "risk_focus": f"主要風險來源：{worst_zone_label}".strip(),
+                "budget_note": "預算可負擔此行動。" if affordable else "若預算不足，行動會引發債務懲罰（信任度下降）。",
+            },
+            "en": {
+                "summary": f"Precomputed policy: minimizes nested CVaR (worst 20%) over the remaining {table.horizon - self.t} hours of the storm.",
+                "chosen_action": f"Chosen: {best_action} {best_zone or ''}".strip(),
+                "risk_focus": f"Main risk driver: {worst_zone or ''}".strip(),
+                "budget_note": "Action is affordable." if affordable else "If budget is insufficient, debt penalty will reduce trust.",
+            },
+        }
+        top_reasons = [
+            "Offline dynamic-programming policy over the full storm (table lookup with interpolation)",
+            f"Primary current damage contribution: {worst_zone or 'N/A'}",
+            "Includes budget/trust-aware penalty to avoid infeasible actions",
+        ]
+        return Recommendation(
+            action=best_action,
+            zone_id=best_zone,
+            reason=json.dumps(reasons, ensure_ascii=False),
+            expected_loss=float(round(float(q[best]), 2)),
+            confidence=float(round(conf_val, 2)),
+            top_reasons=top_reasons,
+        )
 
     def _recommend_action(self) -> Recommendation:
         """
@@ -495,69 +1355,103 @@ class GameSession:
 
         We optimize the *worst-case tail* (CVaR) of cumulative loss under rainfall uncertainty,
         which is more appropriate for disaster management than average-loss minimization.
+
+        Sampling is adaptive: every candidate is evaluated on the same rain samples, starting with
+        CVAR_MIN_SAMPLES and doubling until the gap between the best and second-best candidate is
+        resolved (paired bootstrap over the shared samples) or CVAR_MAX_SAMPLES is reached. With
+        CVAR_RACING, candidates that are clearly worse than the current best are dropped after each round,
+        so later (larger) rounds only simulate the survivors.
         """
+        if self._policy is not None:
+            recommendation = self._policy_recommendation()
+            POLICY_STATS["hits" if recommendation is not None else "fallbacks"] += 1
+            if recommendation is not None:
+                return recommendation
+
         horizon = 3
-        n_samples = 60
         alpha = 0.8  # CVaR over worst 20%
 
-        best_action = "none"
-        best_zone: Optional[str] = None
-        best_cvar = float("inf")
-        best_mean = float("inf")
-        best_losses: List[float] = []
-        best_zone_damage: Dict[str, float] = {}
-
-        # Always allow "none" and "funding" as special actions handled heuristically
+        # Candidates: (action, zone, config, penalty). "none" and "funding" are handled as special actions
         # ("funding" has complex trust tradeoff; we gate it via budget checks)
         candidates: List[Tuple[str, Optional[str], ActionConfig, float]] = []
         for aid, acfg in self.scenario.actions.items():
-            if aid in ["none", "funding"]:
-                candidates.append((aid, None, acfg, float(acfg.cost)))
-            else:
-                for zid in self.scenario.params.zones:
-                    candidates.append((aid, zid, acfg, float(acfg.cost)))
-
-        # Evaluate CVaR for mitigation actions; keep "none"/"funding" as baselines.
-        for aid, zid, acfg, base_cost in candidates:
             if aid == "funding":
                 # Funding is only recommended when budget is critically low
                 # (uses cost as trust penalty in step(), effect as budget gain)
                 if self.budget <= 5.0 and self.trust > 15.0:
-                    # Use a synthetic loss metric: lower is better; treat trust penalty as cost
-                    # This keeps funding from dominating purely via budget gain.
-                    synthetic = base_cost + 10.0
-                    if synthetic < best_cvar:
-                        best_action, best_zone = aid, None
-                        best_cvar, best_mean = synthetic, synthetic
-                        best_losses = [synthetic]
-                        best_zone_damage = {z: 0.0 for z in self.zone_storage}
-                continue
-
-            if aid == "none":
+                    candidates.append((aid, None, acfg, 0.0))
+            elif aid == "none":
                 # Evaluate "none" via CVaR with zero effect
-                cvar, mean_loss, losses, zone_dmg = self._simulate_cvar_rollout(
-                    first_action=acfg, first_zone=None, horizon=horizon, n_samples=n_samples, alpha=alpha
-                )
-                if cvar < best_cvar:
-                    best_action, best_zone = aid, None
-                    best_cvar, best_mean = cvar, mean_loss
-                    best_losses, best_zone_damage = losses, zone_dmg
-                continue
-
-            # Normal mitigation action (single zone only in this candidate list)
-            cvar, mean_loss, losses, zone_dmg = self._simulate_cvar_rollout(
-                first_action=acfg, first_zone=zid, horizon=horizon, n_samples=n_samples, alpha=alpha
-            )
-                
-            # Budget/trust-aware penalty: avoid actions you can't afford (debt hurts trust in step()).
-            final_cost = float(acfg.cost)
-            if self.budget < final_cost:
-                cvar += 8.0  # approximate debt-trust penalty
-
-            if cvar < best_cvar:
-                best_action, best_zone = aid, zid
-                best_cvar, best_mean = cvar, mean_loss
-                best_losses, best_zone_damage = losses, zone_dmg
+                candidates.append((aid, None, acfg, 0.0))
+            else:
+                # Budget/trust-aware penalty: avoid actions you can't afford (debt hurts trust in step()).
+                penalty = 8.0 if self.budget < float(acfg.cost) else 0.0  # approximate debt-trust penalty
+                for zid in self.scenario.params.zones:
+                    candidates.append((aid, zid, acfg, penalty))
+        if not candidates:
+            candidates.append(("none", None, ActionConfig(cost=0.0, effect=0.0), 0.0))
+
+        # Mitigation candidates are simulated together as one tensor; "funding" keeps a constant synthetic loss.
+        # Use a synthetic loss metric: lower is better; treat trust penalty as cost
+        # This keeps funding from dominating purely via budget gain.
+        n_zones = len(self._zones.ids)
+        n_cand = len(candidates)
+        is_sim = np.array([c[0] != "funding" for c in candidates])
+        effects = np.array([self._candidate_effects(c[2], c[1]) for c in candidates]).reshape(n_cand, n_zones)
+        costs = np.array([float(c[2].cost) for c in candidates])
+        synthetic = np.array([float(c[2].cost) + 10.0 if c[0] == "funding" else 0.0 for c in candidates])
+        penalties = np.array([c[3] for c in candidates])
+
+        # Dropped candidates keep NaN losses for rows sampled after they were eliminated
+        losses = np.empty((n_cand, 0))
+        zone_damage = np.empty((n_cand, 0, n_zones))
+        alive = np.ones(n_cand, dtype=bool)
+        bootstrap_rng = self._step_rng(1)
+        rollouts = 0
+        n_done = 0
+        n_target = max(1, min(CVAR_MIN_SAMPLES, CVAR_MAX_SAMPLES))
+        while True:
+            factors = self._rain_factors(n_target, horizon)[n_done:n_target]
+            new_losses = np.full((n_cand, len(factors)), np.nan)
+            new_losses[alive] = synthetic[alive, None]
+            new_damage = np.zeros((n_cand, len(factors), n_zones))
+            sim = np.flatnonzero(alive & is_sim)
+            if sim.size:
+                new_losses[sim], new_damage[sim] = self._evaluate_candidates(effects[sim], costs[sim], factors)
+                rollouts += sim.size * len(factors)
+            losses = np.concatenate([losses, new_losses], axis=1)
+            zone_damage = np.concatenate([zone_damage, new_damage], axis=1)
+            n_done = n_target
+
+            live = np.flatnonzero(alive)
+            scores = np.full(n_cand, np.inf)
+            scores[live] = cvar(losses[live], alpha) + penalties[live]
+            best = int(np.argmin(scores))
+            if n_done >= CVAR_MAX_SAMPLES or live.size < 2:
+                break
+            gaps = scores[live] - scores[best]
+            se = cvar_gap_se(losses[live], int(np.searchsorted(live, best)), alpha, bootstrap_rng)
+            second = int(np.argsort(gaps, kind="stable")[1])
+            if gaps[second] > CVAR_Z * se[second] or CVAR_Z * se[second] < CVAR_TOLERANCE:
+                break
+            if CVAR_RACING:
+                alive[live[gaps > CVAR_Z * se]] = False
+            n_target = min(2 * n_done, CVAR_MAX_SAMPLES)
+
+        saved = int(is_sim.sum()) * n_done - rollouts
+        with RACING_STATS_LOCK:
+            RACING_STATS["calls"] += 1
+            RACING_STATS["rollouts"] += rollouts
+            RACING_STATS["rollouts_saved"] += saved
+
+        best_action, best_zone = candidates[best][0], candidates[best][1]
+        best_cvar = float(scores[best])
+        best_losses = np.sort(losses[best]).tolist()
+        best_zone_damage = dict(zip(self._zones.ids, zone_damage[best].mean(axis=0).tolist()))
+        logger.debug(
+            f"Recommendation {best_action}/{best_zone} after {n_done} samples: "
+            f"{rollouts} rollouts, {saved} saved by racing, {int(alive.sum())}/{n_cand} candidates left"
+        )
 
         # Confidence: higher when loss distribution is tight (lower relative dispersion)
         if best_losses:
@@ -610,6 +1504,76 @@ class GameSession:
         )
 
 
+SESSION_FORMAT = 1
+
+def dump_session(session: GameSession) -> bytes:
+    """
+    Compact serialized session for external stores: scalar state, zone storages and cooldowns in scenario
+    order, and the action log as (action index, zone index) pairs. Advice caches, rain samples and the last
+    response are left out; with the seed they are recomputed identically when needed.
+    """
+    zones = list(session.scenario.params.zones)
+    actions = list(session.scenario.actions)
+    log: List[Any] = []
+    for action_name, zone_id in session.action_log:
+        log.extend((actions.index(action_name), zones.index(zone_id) if zone_id in zones else zone_id))
+    return json.dumps(
+        {
+            "v": SESSION_FORMAT,
+            "s": session.scenario.id,
+            "sv": session.scenario_version,
+            "seed": session.seed,
+            "t": session.t,
+            "z": session.storage.tolist(),
+            "b": session.budget,
+            "tr": session.trust,
+            "cd": session.cooldowns.tolist(),
+            "r": session.total_reward,
+            "go": session.is_game_over,
+            "fr": session.failure_reason,
+            "log": log,
+            "ver": session.version,
+            "keys": session.step_keys,
+        },
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+def load_session(data: bytes) -> GameSession:
+    """Inverse of `dump_session`. Raises ValueError for other formats, KeyError for unknown scenarios."""
+    d = json.loads(data)
+    if d.get("v") != SESSION_FORMAT:
+        raise ValueError(f"session format {d.get('v')!r} != {SESSION_FORMAT}")
+    snapshot = SCENARIO_REGISTRY.get(d.get("sv", ""))
+    if snapshot is None:
+        # Created from scenario data this process no longer (or never) had loaded
+        snapshot = SCENARIO_REGISTRY.current()
+        logger.warning(f"Session scenario data {d.get('sv')!r} not loaded; continuing with {snapshot.version}")
+    scenario = snapshot.scenarios[d["s"]]
+    zones = list(scenario.params.zones)
+    actions = list(scenario.actions)
+    session = GameSession(
+        scenario=scenario,
+        rain=snapshot.rainfall[d["s"]],
+        rain_cumsum=snapshot.rain_cumsum[d["s"]],
+        scenario_version=snapshot.version,
+        storage=np.array(d["z"]),
+        trust=d["tr"],
+        cooldowns=np.array(d["cd"]),
+        t=d["t"],
+        total_reward=d["r"],
+        is_game_over=d["go"],
+        failure_reason=d["fr"],
+        seed=d["seed"],
+    )
+    session.budget = d["b"]
+    session.version = d.get("ver", 0)
+    session.step_keys = d.get("keys", {})
+    session.history = None  # not stored; /replay falls back to replaying the action log
+    log = d["log"]
+    session.action_log = [(actions[a], zones[z] if isinstance(z, int) else z) for a, z in zip(log[::2], log[1::2])]
+    return session
+
+
 # -----------------------------
 # FastAPI setup
 # -----------------------------
@@ -639,66 +1603,215 @@ def step_game_api(req: StepRequest):
     return step_game(req)
 
 @app.get("/api/replay/{game_id}")
-def replay_api(game_id: str):
-    return replay(game_id)
+def replay_api(
+    game_id: str,
+    advice: bool = True,
+    start: int = 0,
+    end: Optional[int] = None,
+    fields: Optional[str] = None,
+    format: str = "json",
+):
+    return replay(game_id, advice=advice, start=start, end=end, fields=fields, format=format)
+
+@app.get("/api/forecast/{game_id}")
+def forecast_api(game_id: str):
+    return get_forecast(game_id)
+
+@app.get("/api/recommendation/{game_id}")
+def recommendation_api(game_id: str):
+    return get_recommendation(game_id)
+
+@app.get("/api/sessions/stats")
+def session_stats_api():
+    return session_stats()
 
 @app.get("/api/debug")
 def debug_info():
+    with RACING_STATS_LOCK:
+        racing_stats = dict(RACING_STATS)
+    with SPECULATION_STATS_LOCK:
+        speculation_stats = dict(SPECULATION_STATS)
     return {
         "code_dir": str(CODE_DIR),
         "param_file": str(PARAM_FILE),
         "param_file_exists": PARAM_FILE.exists(),
         "model_dir": str(MODEL_DIR),
         "weights_loaded": len(ML_PARAMS) > 0,
+        "surrogate_engine": SURROGATE is not None,
+        "surrogate_dtype": SURROGATE_DTYPE,
+        "surrogate_variant": SURROGATE.variant if SURROGATE is not None else None,
+        "surrogate_luts": len(ZONE_LUTS),
+        "trajectory_horizon": TRAJECTORY.horizon if TRAJECTORY is not None else None,
+        "trajectory_errors": {f"{a},{b},{c}": round(e, 5) for (a, b, c), e in TRAJECTORY_ERRORS.items()},
+        "ensemble_members": ENSEMBLE.n_members if ENSEMBLE is not None else 0,
+        "cvar_racing": CVAR_RACING,
+        "racing_stats": racing_stats,
+        "speculation": SPECULATE,
+        "speculation_stats": speculation_stats,
+        "advice_processes": ADVICE_PROCESSES,
+        "policy_tables": sorted(POLICIES),
+        "policy_stats": dict(POLICY_STATS),
+        "scenario_version": SCENARIO_REGISTRY.version,
+        "scenario_registry": dict(SCENARIO_REGISTRY.stats),
         "python_version": sys.version,
         "cwd": os.getcwd()
     }
 
-SCENARIOS = load_scenarios()
-RAINFALL: Dict[str, List[float]] = {sid: load_rain_series(spec.csv) for sid, spec in SCENARIOS.items()}
-SESSIONS: Dict[str, GameSession] = {}
+@app.on_event("shutdown")
+def shutdown_pools():
+    if _ADVICE_POOL is not None:
+        _ADVICE_POOL.shutdown(cancel_futures=True)
+    if SPECULATION_POOL is not None:
+        SPECULATION_POOL.shutdown(cancel_futures=True)
+
+SCENARIO_REGISTRY: SnapshotRegistry[ScenarioSnapshot] = SnapshotRegistry(build_scenario_snapshot, check_interval=SCENARIO_CHECK_S)
+def session_version(session: GameSession) -> int:
+    return session.version
+
+def make_session_store() -> SessionStore[GameSession]:
+    """Build the store selected by FLOOD_SESSION_STORE (falls back to memory for unusable settings)."""
+    if SESSION_STORE.startswith("sqlite:"):
+        return SQLiteSessionStore(
+            SESSION_STORE[len("sqlite:"):], dump_session, load_session,
+            ttl=SESSION_TTL, max_sessions=MAX_SESSIONS, max_bytes=SESSION_MAX_BYTES, version_of=session_version,
+        )
+    if SESSION_STORE.startswith(("redis://", "rediss://")):
+        try:
+            import redis
+        except ImportError:
+            logger.error("FLOOD_SESSION_STORE is a Redis URL but the redis package is not installed; using memory.")
+        else:
+            return KeyValueSessionStore(
+                redis.Redis.from_url(SESSION_STORE), dump_session, load_session, ttl=SESSION_TTL, version_of=session_version
+            )
+    elif SESSION_STORE == "kv-local":
+        return KeyValueSessionStore(LocalKeyValue(), dump_session, load_session, ttl=SESSION_TTL, version_of=session_version)
+    elif SESSION_STORE != "memory":
+        logger.error(f"Unknown FLOOD_SESSION_STORE={SESSION_STORE!r}, using memory.")
+    return MemorySessionStore(
+        ttl=SESSION_TTL, max_sessions=MAX_SESSIONS, max_bytes=SESSION_MAX_BYTES,
+        size_of=GameSession.approx_bytes, version_of=session_version,
+    )
+
+SESSIONS = make_session_store()
+logger.info(f"Session store: {SESSIONS.snapshot().get('backend')}")
+
+def get_session(game_id: str) -> GameSession:
+    """Look up a live session: 404 for unknown ids, 410 for sessions that expired, were evicted or can't be restored."""
+    try:
+        session = SESSIONS.get(game_id)
+    except (KeyError, ValueError) as e:
+        logger.warning(f"Could not restore session {game_id}: {e}")
+        raise HTTPException(status_code=410, detail="Game session can no longer be restored; please start a new game")
+    if session is None:
+        reason = SESSIONS.eviction_reason(game_id)
+        if reason is not None:
+            raise HTTPException(status_code=410, detail=f"Game session is no longer available ({reason}); please start a new game")
+        raise HTTPException(status_code=404, detail="Game session not found")
+    return session
 
 @app.get("/scenarios")
 def list_scenarios():
-    global SCENARIOS, RAINFALL
-    SCENARIOS = load_scenarios()
-    RAINFALL = {sid: load_rain_series(spec.csv) for sid, spec in SCENARIOS.items()}
-    # Pydantic v2 compatible serialization
-    return [
-        {
-            "id": spec.id,
-            "name": spec.name,
-            "description": spec.description,
-            "time_step_hr": spec.time_step_hr,
-            "duration_steps": len(RAINFALL.get(spec.id, [])),
-            "params": spec.params.model_dump(),
-            "actions": {k: v.model_dump() for k, v in spec.actions.items()},
-        }
-        for spec in SCENARIOS.values()
-    ]
+    return list(SCENARIO_REGISTRY.current().summaries)
 
 @app.post("/start")
 def start_game(req: StartRequest):
-    global SCENARIOS, RAINFALL
-    SCENARIOS = load_scenarios()
-    RAINFALL = {sid: load_rain_series(spec.csv) for sid, spec in SCENARIOS.items()}
-    if req.scenario_id not in SCENARIOS: raise HTTPException(status_code=404, detail="Scenario not found")
+    snapshot = SCENARIO_REGISTRY.current()
+    if req.scenario_id not in snapshot.scenarios: raise HTTPException(status_code=404, detail="Scenario not found")
     game_id = str(uuid.uuid4())
-    scenario = SCENARIOS[req.scenario_id]
-    rain = RAINFALL[req.scenario_id]
-    session = GameSession(scenario=scenario, rain=rain)
-    SESSIONS[game_id] = session
-    initial = session._initial_response()
-    session.history.append(initial)
-    return {"game_id": game_id, "scenario": scenario, "initial": initial}
+    scenario = snapshot.scenarios[req.scenario_id]
+    rain, rain_cumsum = snapshot.rainfall[req.scenario_id], snapshot.rain_cumsum[req.scenario_id]
+    session = GameSession(scenario=scenario, rain=rain, rain_cumsum=rain_cumsum, scenario_version=snapshot.version)
+    if req.seed is not None:
+        session.seed = req.seed
+    with session.lock:
+        # Built before the session is stored, so a failure doesn't leave a broken session behind
+        initial = session._initial_response(advice=req.advice)
+        session.last_response = initial
+        SESSIONS.put(game_id, session)
+        session.speculate(advice=req.advice)
+    return {"game_id": game_id, "scenario": scenario, "initial": initial, "seed": session.seed}
 
 @app.post("/step")
 def step_game(req: StepRequest):
-    if req.game_id not in SESSIONS: raise HTTPException(status_code=404, detail="Game session not found")
-    return SESSIONS[req.game_id].step(req.action, req.zone_id)
+    # Steps on one session are serialized by its lock (memory store) or by compare-and-swap on its version
+    # (external stores, where each request works on its own copy); different sessions never wait on each other
+    for _ in range(STEP_RETRIES):
+        session = get_session(req.game_id)
+        with session.lock:
+            response = session.keyed_response(req.idempotency_key, advice=req.advice)
+            if response is not None:
+                return response
+            version = session.version
+            response = session.step(req.action, req.zone_id, advice=req.advice, idempotency_key=req.idempotency_key)
+            if session.version == version or SESSIONS.replace(req.game_id, session, version):
+                session.speculate(advice=req.advice)
+                return response
+        logger.info(f"Session {req.game_id} was updated concurrently, retrying step")
+    raise HTTPException(status_code=409, detail="Game session was updated concurrently; please retry")
+
+@app.get("/sessions/stats")
+def session_stats():
+    return SESSIONS.snapshot()
+
+@app.get("/forecast/{game_id}")
+def get_forecast(game_id: str):
+    session = get_session(game_id)
+    with session.lock:
+        return session.forecast()
+
+@app.get("/recommendation/{game_id}")
+def get_recommendation(game_id: str):
+    session = get_session(game_id)
+    with session.lock:
+        return session.recommendation()
+
+def replay_fields(fields: Optional[str]) -> Optional[set]:
+    """Parse a comma-separated `fields` selection of StepResponse fields (`t` is always included)."""
+    if not fields:
+        return None
+    selected = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = selected - set(StepResponse.model_fields)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown replay fields: {', '.join(sorted(unknown))}")
+    return selected | {"t"}
 
 @app.get("/replay/{game_id}")
-def replay(game_id: str):
-    if game_id not in SESSIONS: raise HTTPException(status_code=404, detail="Game session not found")
-    session = SESSIONS[game_id]
-    return ReplayResponse(scenario_id=session.scenario.id, history=session.history)
+def replay(
+    game_id: str,
+    advice: bool = True,
+    start: int = 0,
+    end: Optional[int] = None,
+    fields: Optional[str] = None,
+    format: str = "json",
+):
+    if format not in ("json", "ndjson"):
+        raise HTTPException(status_code=400, detail=f"Unknown replay format: {format}")
+    include = replay_fields(fields)
+    if include is not None and not include & {"forecast", "recommendation"}:
+        advice = False
+    session = get_session(game_id)
+    with session.lock:
+        total = session.t + 1
+        start = max(0, min(start, total))
+        end = total if end is None else max(start, min(end, total))
+        # Served from the columnar history; sessions restored from an external store replay their action log.
+        # Steps before the current t never change, so they can be materialized after the lock is released.
+        steps = session.iter_history(start, end, advice=advice)
+    if format == "ndjson":
+        # One StepResponse per line, written as each step is materialized
+        lines = (step.model_dump_json(include=include) + "\n" for step in steps)
+        headers = {
+            "X-Replay-Scenario": session.scenario.id,
+            "X-Replay-Seed": str(session.seed),
+            "X-Replay-Total": str(total),
+        }
+        return StreamingResponse(lines, media_type="application/x-ndjson", headers=headers)
+    return ReplayResponse(
+        scenario_id=session.scenario.id,
+        seed=session.seed,
+        total=total,
+        start=start,
+        end=end,
+        history=[step.model_dump(include=include) for step in steps],
+    )
@@ -0,0 +1,93 @@
+"""
+Uniform [0, 1) point streams for the rain-perturbation Monte Carlo.
+
+- iid:   plain pseudo-random draws
+- lhs:   Latin hypercube batches (one stratum per sample in every dimension)
+- sobol: Sobol low-discrepancy sequence with a random digital shift
+
+Streams are extendable: `draw(n)` returns the next `n` points, so adaptive sampling can add samples
+without redrawing earlier ones.
+"""
+from __future__ import annotations
+
+from typing import List
+
+import numpy as np
+
+SAMPLING_METHODS = ("iid", "lhs", "sobol")
+
+# Joe & Kuo (2008) primitive polynomials (degree s, coefficients a) and initial direction numbers m
+# for Sobol dimensions 2..13; dimension 1 uses m_k = 1.
+_SOBOL_TABLE = (
+    (1, 0, (1,)),
+    (2, 1, (1, 3)),
+    (3, 1, (1, 3, 1)),
+    (3, 2, (1, 1, 1)),
+    (4, 1, (1, 1, 3, 3)),
+    (4, 4, (1, 3, 5, 13)),
+    (5, 2, (1, 1, 5, 5, 17)),
+    (5, 4, (1, 1, 5, 5, 5)),
+    (5, 7, (1, 1, 7, 11, 19)),
+    (5, 11, (1, 1, 5, 1, 1)),
+    (5, 13, (1, 1, 1, 3, 11)),
+    (5, 14, (1, 3, 5, 5, 31)),
+)
+SOBOL_MAX_DIM = len(_SOBOL_TABLE) + 1
+_BITS = 32
+
+
+def _direction_numbers(dim: int) -> np.ndarray:
+    """(dim, 32) uint64 direction numbers V[j][k], scaled so that points are V / 2**32."""
+    v = np.zeros((dim, _BITS), dtype=np.uint64)
+    for k in range(_BITS):
+        v[0, k] = 1 << (_BITS - 1 - k)
+    for j in range(1, dim):
+        s, a, m = _SOBOL_TABLE[j - 1]
+        row: List[int] = [0] * _BITS
+        for k in range(min(s, _BITS)):
+            row[k] = m[k] << (_BITS - 1 - k)
+        for k in range(s, _BITS):
+            value = row[k - s] ^ (row[k - s] >> s)
+            for i in range(1, s):
+                if (a >> (s - 1 - i)) & 1:
+                    value ^= row[k - i]
+            row[k] = value
+        v[j] = row
+    return v
+
+
+class RainSampler:
+    """Extendable stream of uniform [0, 1) points of dimension `dim` (one per horizon hour)."""
+
+    def __init__(self, method: str, dim: int, rng: np.random.Generator):
+        if method not in SAMPLING_METHODS:
+            raise ValueError(f"unknown sampling method {method!r}; expected one of {SAMPLING_METHODS}")
+        if method == "sobol" and dim > SOBOL_MAX_DIM:
+            method = "lhs"
+        self.method = method
+        self.dim = dim
+        self.rng = rng
+        self.drawn = 0
+        if method == "sobol":
+            self._v = _direction_numbers(dim)
+            self._shift = rng.integers(0, 1 << _BITS, size=dim, dtype=np.uint64)
+
+    def draw(self, n: int) -> np.ndarray:
+        """Next `n` points, shape (n, dim)."""
+        if n <= 0:
+            return np.empty((0, self.dim))
+        if self.method == "iid":
+            u = self.rng.random((n, self.dim))
+        elif self.method == "lhs":
+            # One point per stratum [k/n, (k+1)/n) in each dimension, strata shuffled independently
+            strata = np.argsort(self.rng.random((n, self.dim)), axis=0)
+            u = (strata + self.rng.random((n, self.dim))) / n
+        else:
+            idx = np.arange(self.drawn, self.drawn + n, dtype=np.uint64)
+            x = np.zeros((n, self.dim), dtype=np.uint64)
+            for k in range(min(int(idx[-1]).bit_length(), _BITS)):
+                bit = (idx >> np.uint64(k)) & np.uint64(1)
+                x ^= bit[:, None] * self._v[:, k]
+            u = (x ^ self._shift).astype(np.float64) / float(1 << _BITS)
+        self.drawn += n
+        return u
@@ -48,9 +48,9 @@ export const TimelineReview: React.FC<TimelineReviewProps> = ({ history, onClose
             </thead>
             <tbody>
               {history.map((step, idx) => {
-                const avgRisk = step.forecast.risk_mean[0] || 0;
-                const aiAction = step.recommendation.action;
-                const aiZone = step.recommendation.zone_id;
+                const avgRisk = step.forecast?.risk_mean[0] || 0;
+                const aiAction = step.recommendation?.action;
+                const aiZone = step.recommendation?.zone_id;
                 const playerAction = step.action;
                 const playerZone = step.zone_id;
                 
@@ -63,8 +63,9 @@ export interface StepResponse {
   t: number;
   obs: Observation;
   state: State;
-  forecast: Forecast;
-  recommendation: Recommendation;
+  // null when the step was requested with advice: false
+  forecast?: Forecast | null;
+  recommendation?: Recommendation | null;
   reward: Reward;
   events: string[];
 }
@@ -73,6 +74,7 @@ export interface StartResponse {
   game_id: string;
   scenario: ScenarioSummary;
   initial: StepResponse;
+  seed: number;
 }
 
 const API_BASE = process.env.NEXT_PUBLIC_API_URL || (process.env.NODE_ENV === 'production' ? '/api' : "http://localhost:8000");
@@ -99,16 +101,41 @@ export async function startGame(scenario_id: string, difficulty = "standard"): P
   return handle<StartResponse>(res);
 }
 
-export async function sendAction(game_id: string, action: ActionName, zone_id?: string): Promise<StepResponse> {
+export async function sendAction(
+  game_id: string,
+  action: ActionName,
+  zone_id?: string,
+  idempotency_key?: string
+): Promise<StepResponse> {
   const res = await fetch(`${API_BASE}/step`, {
     method: "POST",
     headers: { "Content-Type": "application/json" },
-    body: JSON.stringify({ game_id, action, zone_id }),
+    body: JSON.stringify({ game_id, action, zone_id, idempotency_key }),
   });
   return handle<StepResponse>(res);
 }
 
-export async function fetchReplay(game_id: string): Promise<{ scenario_id: string; history: StepResponse[] }> {
-  const res = await fetch(`${API_BASE}/replay/${game_id}`);
-  return handle(res);
+export type ReplayOptions = {
+  start?: number;
+  end?: number;
+  fields?: (keyof StepResponse)[];
+};
+
+export type ReplayResponse = {
+  scenario_id: string;
+  seed: number;
+  total: number;
+  start: number;
+  end: number;
+  history: StepResponse[];
+};
+
+export async function fetchReplay(game_id: string, options: ReplayOptions = {}): Promise<ReplayResponse> {
+  const params = new URLSearchParams();
+  if (options.start !== undefined) params.set("start", String(options.start));
+  if (options.end !== undefined) params.set("end", String(options.end));
+  if (options.fields) params.set("fields", options.fields.join(","));
+  const query = params.toString();
+  const res = await fetch(`${API_BASE}/replay/${game_id}${query ? `?${query}` : ""}`);
+  return handle<ReplayResponse>(res);
 }
@@ -93,7 +93,8 @@ export default function Play() {
     setError(null);
     try {
       const zid = selectedZone === "any" ? undefined : selectedZone;
-      const res = await sendAction(gameId, action, zid);
+      // Keyed by timestep, so a repeated click for the same step returns the same response
+      const res = await sendAction(gameId, action, zid, `${gameId}:${current?.t ?? 0}`);
       const nextHistory = [...history, res];
       setCurrent(res);
       setHistory(nextHistory);
@@ -360,37 +361,41 @@ export default function Play() {
           {/* AI Intelligence Card */}
           <div className="card">
             <h3 style={{ marginTop: 0 }}>{t.aiAdvisor}</h3>
-            <div style={{ background: "#0f172a", padding: 12, borderRadius: 10, border: "1px solid #334155" }}>
-              <div style={{ display: "flex", justifyContent: "space-between", alignItems: "flex-start", marginBottom: 4 }}>
-                <div style={{ fontSize: 12, color: "#94a3b8" }}>{t.recommended}</div>
-                <div style={{ 
-                  fontSize: 10, 
-                  padding: "2px 6px", 
-                  borderRadius: 4, 
-                  background: (current.recommendation.confidence || 0) > 0.9 ? "#065f46" : "#1e293b",
-                  color: (current.recommendation.confidence || 0) > 0.9 ? "#34d399" : "#94a3b8",
-                  border: "1px solid #334155"
-                }}>
-                  {Math.round((current.recommendation.confidence || 0.95) * 100)}% Conf.
+            {current.recommendation ? (
+              <div style={{ background: "#0f172a", padding: 12, borderRadius: 10, border: "1px solid #334155" }}>
+                <div style={{ display: "flex", justifyContent: "space-between", alignItems: "flex-start", marginBottom: 4 }}>
+                  <div style={{ fontSize: 12, color: "#94a3b8" }}>{t.recommended}</div>
+                  <div style={{ 
+                    fontSize: 10, 
+                    padding: "2px 6px", 
+                    borderRadius: 4, 
+                    background: (current.recommendation.confidence || 0) > 0.9 ? "#065f46" : "#1e293b",
+                    color: (current.recommendation.confidence || 0) > 0.9 ? "#34d399" : "#94a3b8",
+                    border: "1px solid #334155"
+                  }}>
+                    {Math.round((current.recommendation.confidence || 0.95) * 100)}% Conf.
+                  </div>
                 </div>
-              </div>
-              <div style={{ fontSize: 20, fontWeight: 800, color: "#22c55e", textTransform: "uppercase" }}>
-                {(t as any)[current.recommendation.action] || current.recommendation.action} 
-                {current.recommendation.zone_id && ` @ ${(t as any)[current.recommendation.zone_id] || current.recommendation.zone_id}`}
-              </div>
-              <div style={{ color: "#cbd5e1", fontSize: 13, marginTop: 4, lineHeight: 1.4 }}>{getReason(current.recommendation.reason)}</div>
-              
-              {/* New XAI Reasons */}
-              {current.recommendation.top_reasons && current.recommendation.top_reasons.length > 0 && (
-                <div style={{ marginTop: 10, borderTop: "1px solid #334155", paddingTop: 8 }}>
-                  {current.recommendation.top_reasons.map((reason, i) => (
-                    <div key={i} style={{ fontSize: 11, color: "#94a3b8", display: "flex", gap: 6, marginBottom: 2 }}>
-                      <span style={{ color: "#22c55e" }}>•</span> {reason}
-                    </div>
-                  ))}
+                <div style={{ fontSize: 20, fontWeight: 800, color: "#22c55e", textTransform: "uppercase" }}>
+                  {(t as any)[current.recommendation.action] || current.recommendation.action} 
+                  {current.recommendation.zone_id && ` @ ${(t as any)[current.recommendation.zone_id] || current.recommendation.zone_id}`}
                 </div>
-              )}
-            </div>
+                <div style={{ color: "#cbd5e1", fontSize: 13, marginTop: 4, lineHeight: 1.4 }}>{getReason(current.recommendation.reason)}</div>
+              
+                {/* New XAI Reasons */}
+                {current.recommendation.top_reasons && current.recommendation.top_reasons.length > 0 && (
+                  <div style={{ marginTop: 10, borderTop: "1px solid #334155", paddingTop: 8 }}>
+                    {current.recommendation.top_reasons.map((reason, i) => (
+                      <div key={i} style={{ fontSize: 11, color: "#94a3b8", display: "flex", gap: 6, marginBottom: 2 }}>
+                        <span style={{ color: "#22c55e" }}>•</span> {reason}
+                      </div>
+                    ))}
+                  </div>
+                )}
+              </div>
+            ) : (
+              <div style={{ color: "#64748b", fontSize: 13 }}>-</div>
+            )}
             
             <div style={{ marginTop: 16 }}>
               <div style={{ fontSize: 12, color: "#94a3b8", marginBottom: 12, display: "flex", alignItems: "center", gap: 6 }}>
@@ -398,7 +403,7 @@ export default function Play() {
               </div>
               <div style={{ display: "grid", gridTemplateColumns: "repeat(3, 1fr)", gap: 12 }}>
                 {[0, 1, 2].map((idx) => {
-                  const prob = (current.forecast.prob_critical && current.forecast.prob_critical.length > idx) 
+                  const prob = (current.forecast?.prob_critical && current.forecast.prob_critical.length > idx) 
                     ? current.forecast.prob_critical[idx] 
                     : 0;
                   const label = `+${idx + 1}h`;
@@ -457,12 +462,18 @@ export default function Play() {
           {/* Forecast Card (Compact) */}
           <div className="card">
             <h3 style={{ marginTop: 0 }}>{t.forecastTitle}</h3>
-            <div style={{ height: "160px" }}>
-              <ForecastChart forecast={current.forecast} />
-            </div>
-            <p style={{ fontSize: 11, color: "#64748b", marginTop: 8, lineHeight: 1.2 }}>
-              {t.trend} {current.forecast.risk_mean[2] > current.forecast.risk_mean[0] ? t.rising : t.declining}
-            </p>
+            {current.forecast ? (
+              <>
+                <div style={{ height: "160px" }}>
+                  <ForecastChart forecast={current.forecast} />
+                </div>
+                <p style={{ fontSize: 11, color: "#64748b", marginTop: 8, lineHeight: 1.2 }}>
+                  {t.trend} {current.forecast.risk_mean[2] > current.forecast.risk_mean[0] ? t.rising : t.declining}
+                </p>
+              </>
+            ) : (
+              <div style={{ color: "#64748b", fontSize: 13 }}>-</div>
+            )}
           </div>
 
         </div>
@@ -18,7 +18,8 @@ export default function ReplayPage() {
       return;
     }
     setLoading(true);
-    fetchReplay(gid)
+    // The table never shows forecasts, so skip them
+    fetchReplay(gid, { fields: ["action", "zone_id", "obs", "state", "reward", "recommendation"] })
       .then((res) => setHistory(res.history))
       .catch((err) => setError(err.message || "Failed to load replay"))
       .finally(() => setLoading(false));
@@ -55,7 +56,7 @@ export default function ReplayPage() {
                   <td>{h.obs.rain.toFixed(1)}</td>
                   <td style={{ color: avgRisk > 0.5 ? "#ef4444" : "#22c55e" }}>{(avgRisk * 100).toFixed(0)}%</td>
                   <td style={{ color: h.reward.delta < 0 ? "#f87171" : "#22c55e" }}>{h.reward.delta.toFixed(2)}</td>
-                  <td style={{ color: "#94a3b8", fontSize: 12 }}>{h.recommendation.reason}</td>
+                  <td style={{ color: "#94a3b8", fontSize: 12 }}>{h.recommendation?.reason ?? "-"}</td>
                 </tr>
               );
             })}
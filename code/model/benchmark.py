@@ -0,0 +1,244 @@
+"""
+Fidelity-vs-latency benchmark for the storage surrogate backends.
+
+Runs every available inference backend over the same sampled transitions and over full
+`scenario_params.json` episodes, and reports throughput, latency percentiles, storage error
+and how often the AI recommendation diverges from the reference backend.
+
+Usage (from the repository root):
+    python code/model/benchmark.py
+    python code/model/benchmark.py --samples 50000 --batch 512 --json bench.json
+"""
+import argparse
+import json
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+BACKEND_DIR = Path(__file__).resolve().parents[1] / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from app import main as backend  # noqa: E402
+from app.surrogate import VARIANTS, SurrogateEngine, SurrogateEnsemble, TrajectorySurrogate  # noqa: E402
+
+REFERENCE = "mlp_f64"
+
+
+@contextmanager
+def use_backend(engine, luts, trajectory=None, ensemble=None):
+    """
+    Temporarily swap the backend's surrogate engine, zone LUTs, trajectory surrogate and ensemble. The
+    last two default to None, so every backend other than "trajectory" / "ensemble" runs plain one-step
+    rollouts and forecasts whatever the server's env enables.
+    """
+    saved = backend.SURROGATE, backend.ZONE_LUTS, backend.TRAJECTORY, backend.ENSEMBLE
+    backend.SURROGATE, backend.ZONE_LUTS, backend.TRAJECTORY, backend.ENSEMBLE = engine, luts, trajectory, ensemble
+    try:
+        yield
+    finally:
+        backend.SURROGATE, backend.ZONE_LUTS, backend.TRAJECTORY, backend.ENSEMBLE = saved
+
+
+def build_backends():
+    """
+    name -> (engine, luts, trajectory, ensemble). The formula backend is always present; MLP variants need
+    model_weights.npz, and "trajectory" / "ensemble" run the f64 engine with only that extra model enabled.
+    """
+    backends = {}
+    if backend.ML_PARAMS:
+        f64 = SurrogateEngine.from_params(backend.ML_PARAMS, dtype="float64")
+        backends["mlp_f64"] = (f64, {}, None, None)
+        backends["mlp_f32"] = (SurrogateEngine.from_params(backend.ML_PARAMS, dtype="float32"), {}, None, None)
+        for variant in VARIANTS[1:]:
+            try:
+                engine = SurrogateEngine.from_params(backend.ML_PARAMS, variant=variant)
+                backends[f"mlp_{variant}"] = (engine, {}, None, None)
+            except ValueError as e:
+                print(f"Skipping variant {variant}: {e}")
+        saved_flag = backend.SURROGATE_LUT
+        backend.SURROGATE_LUT = True
+        try:
+            with use_backend(f64, {}):
+                snapshot = backend.SCENARIO_REGISTRY.current()
+                for sid, spec in snapshot.scenarios.items():
+                    backend.ensure_zone_luts(spec, snapshot.rainfall[sid])
+                luts = dict(backend.ZONE_LUTS)
+        finally:
+            backend.SURROGATE_LUT = saved_flag
+        backends["lut"] = (f64, luts, None, None)
+        try:
+            trajectory = TrajectorySurrogate.from_params(backend.ML_PARAMS, dtype="float64")
+            ensemble = SurrogateEnsemble.from_params(backend.ML_PARAMS, dtype="float64")
+        except ValueError as e:
+            print(f"Skipping trajectory/ensemble: {e}")
+            trajectory = ensemble = None
+        if trajectory is not None:
+            # Only zones that pass the backend's check against chained one-step calls use it
+            with use_backend(f64, {}, trajectory, None):
+                for sid, spec in snapshot.scenarios.items():
+                    backend.check_trajectory(spec, snapshot.rainfall[sid])
+            backends["trajectory"] = (f64, {}, trajectory, None)
+        if ensemble is not None:
+            backends["ensemble"] = (f64, {}, None, ensemble)
+    backends["formula"] = (None, {}, None, None)
+    return backends
+
+
+def sample_inputs(n, seed):
+    """Random transitions drawn from the shipped scenarios (zone params, perturbed rain, action effects)."""
+    rng = np.random.default_rng(seed)
+    zones = []
+    snapshot = backend.SCENARIO_REGISTRY.current()
+    for sid, spec in snapshot.scenarios.items():
+        rain_max = max(snapshot.rainfall[sid], default=0.0) * backend.RAIN_PERTURB_HIGH
+        effects = [0.0] + [cfg.effect for aid, cfg in spec.actions.items() if aid != "funding"]
+        for zp in spec.params.zones.values():
+            zones.append((zp, rain_max, effects))
+    pick = rng.integers(0, len(zones), size=n)
+    params = [zones[i][0] for i in pick]
+    storages = np.array([rng.uniform(0.0, 3.0 * zp.threshold) for zp in params])
+    rains = np.array([rng.uniform(0.0, zones[i][1]) for i in pick])
+    effects = np.array([zones[i][2][rng.integers(0, len(zones[i][2]))] for i in pick])
+    return params, storages, rains, effects
+
+
+def percentiles(latencies_ns):
+    arr = np.asarray(latencies_ns, dtype=np.float64) / 1e3
+    return float(np.percentile(arr, 50)), float(np.percentile(arr, 99))
+
+
+def bench_transitions(backends, n, batch, seed):
+    params, storages, rains, effects = sample_inputs(n, seed)
+    a = np.array([zp.a for zp in params])
+    b = np.array([zp.b for zp in params])
+    c = np.array([zp.c for zp in params])
+    formula = np.maximum(a * storages + b * rains - c * effects, 0.0)
+
+    outputs = {}
+    rows = []
+    for name, (engine, luts, trajectory, ensemble) in backends.items():
+        if trajectory is not None or ensemble is not None:
+            continue  # single transitions are the f64 engine's; these only change rollouts and forecasts
+        with use_backend(engine, luts):
+            # Scalar path: one call per transition
+            scalar = np.empty(n)
+            lat = []
+            for i, zp in enumerate(params):
+                t0 = time.perf_counter_ns()
+                scalar[i] = backend.predict_next_storage(storages[i], rains[i], effects[i], zp)
+                lat.append(time.perf_counter_ns() - t0)
+            rows.append((f"{name}/scalar", n / (sum(lat) / 1e9), *percentiles(lat), scalar))
+
+            outputs[name] = scalar
+            if luts:
+                continue  # zone LUTs only serve the scalar path; the batched path is the engine's own
+            # Batched path: fixed-size chunks
+            batched = np.empty(n)
+            lat = []
+            for lo in range(0, n, batch):
+                hi = min(lo + batch, n)
+                t0 = time.perf_counter_ns()
+                batched[lo:hi] = backend.predict_next_storage_batch(
+                    storages[lo:hi], rains[lo:hi], effects[lo:hi], a[lo:hi], b[lo:hi], c[lo:hi]
+                )
+                lat.append(time.perf_counter_ns() - t0)
+            rows.append((f"{name}/batch{batch}", n / (sum(lat) / 1e9), *percentiles(lat), batched))
+
+    reference = outputs.get(REFERENCE, formula)
+    results = []
+    for label, rate, p50, p99, values in rows:
+        results.append({
+            "backend": label,
+            "calls_per_sec": rate,
+            "p50_us": p50,
+            "p99_us": p99,
+            "max_abs_err_vs_mlp": float(np.max(np.abs(values - reference))),
+            "max_abs_err_vs_formula": float(np.max(np.abs(values - formula))),
+        })
+    return results
+
+
+def play_episode(spec, rain, seed, actions=None):
+    """
+    Play one episode. With `actions=None` the AI recommendation is followed; otherwise the given
+    (action, zone) sequence is replayed. Returns (actions, recommendations, storages, step latencies).
+    """
+    session = backend.GameSession(scenario=spec, rain=list(rain), seed=seed)
+    rec = session._recommend_action()
+    played, recs, storages, lat = [], [], [], []
+    for t in range(len(rain) if actions is None else len(actions)):
+        action, zone = (rec.action, rec.zone_id) if actions is None else actions[t]
+        recs.append((rec.action, rec.zone_id))
+        t0 = time.perf_counter_ns()
+        res = session.step(action, zone)
+        lat.append(time.perf_counter_ns() - t0)
+        played.append((action, zone))
+        storages.append([z.storage for z in res.state.zones.values()])
+        rec = res.recommendation
+        if res.state.done or res.state.game_over:
+            break
+    return played, recs, np.asarray(storages), lat
+
+
+def bench_episodes(backends, seed):
+    results = []
+    ref_name = REFERENCE if REFERENCE in backends else "formula"
+    snapshot = backend.SCENARIO_REGISTRY.current()
+    for sid, spec in snapshot.scenarios.items():
+        rain = snapshot.rainfall[sid]
+        with use_backend(*backends[ref_name]):
+            ref_actions, ref_recs, ref_storages, _ = play_episode(spec, rain, seed)
+        for name, config in backends.items():
+            with use_backend(*config):
+                _, recs, storages, lat = play_episode(spec, rain, seed, actions=ref_actions)
+            steps = min(len(recs), len(ref_recs))
+            diverged = sum(1 for i in range(steps) if recs[i] != ref_recs[i])
+            k = min(len(storages), len(ref_storages))
+            p50, p99 = percentiles(lat)
+            results.append({
+                "scenario": sid,
+                "backend": name,
+                "steps": steps,
+                "step_p50_ms": p50 / 1e3,
+                "step_p99_ms": p99 / 1e3,
+                "max_abs_storage_err": float(np.max(np.abs(storages[:k] - ref_storages[:k]))) if k else 0.0,
+                "rec_divergence": diverged / max(steps, 1),
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=20000, help="sampled transitions per backend")
+    parser.add_argument("--batch", type=int, default=256, help="batch size for the batched path")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", type=Path, default=None, help="also write results to this file")
+    args = parser.parse_args()
+
+    backends = build_backends()
+    print(f"Backends: {list(backends)} (reference: {REFERENCE if REFERENCE in backends else 'formula'})")
+
+    transitions = bench_transitions(backends, args.samples, args.batch, args.seed)
+    print(f"\nSampled transitions (n={args.samples})")
+    print(f"{'backend':<20}{'calls/s':>14}{'p50 us':>10}{'p99 us':>10}{'err vs mlp':>12}{'err vs formula':>16}")
+    for r in transitions:
+        print(f"{r['backend']:<20}{r['calls_per_sec']:>14,.0f}{r['p50_us']:>10.2f}{r['p99_us']:>10.2f}"
+              f"{r['max_abs_err_vs_mlp']:>12.5f}{r['max_abs_err_vs_formula']:>16.5f}")
+
+    episodes = bench_episodes(backends, args.seed)
+    print("\nFull episodes (reference actions replayed on every backend)")
+    print(f"{'scenario':<26}{'backend':<12}{'steps':>6}{'p50 ms':>10}{'p99 ms':>10}{'max err':>10}{'rec diverge':>13}")
+    for r in episodes:
+        print(f"{r['scenario']:<26}{r['backend']:<12}{r['steps']:>6}{r['step_p50_ms']:>10.2f}{r['step_p99_ms']:>10.2f}"
+              f"{r['max_abs_storage_err']:>10.4f}{r['rec_divergence']:>13.1%}")
+
+    if args.json:
+        args.json.write_text(json.dumps({"transitions": transitions, "episodes": episodes}, indent=2))
+        print(f"\nResults written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -59,7 +59,73 @@ def generate_data(num_samples=10000):
         
     return pd.DataFrame(data)
 
+# Horizon of the multi-step trajectory surrogate (matches the 3-hour CVaR rollouts in main.py)
+TRAJECTORY_HORIZON = 3
+# Rain perturbation range of the backend's Monte Carlo (RAIN_PERTURB_LOW / RAIN_PERTURB_HIGH in main.py)
+RAIN_PERTURB = (0.6, 1.4)
+# Share of windows whose rain is zeroed after a random hour, so zero-padded shorter horizons are in distribution
+PADDED_SHARE = 0.25
+
+def load_rain(csv_name):
+    """Hourly rain of a scenario's series (same format as the backend's load_rain_series)."""
+    values = []
+    with open(SCENARIO_PARAMS_PATH.parent / csv_name, "r", encoding="utf-8") as f:
+        next(f)
+        for line in f:
+            parts = line.strip().split(",")
+            if len(parts) == 2:
+                values.append(float(parts[1]))
+    return values or [0.0]
+
+def zone_storage_max(z_params, rain_max):
+    """Storage bound of a zone in play: 1.1x its steady state under `rain_max` (same as the backend's zone_storage_max)."""
+    return max(z_params["b"] * rain_max / max(1.0 - z_params["a"], 1e-3), 3.0 * z_params["threshold"]) * 1.1
+
+def generate_trajectory_data(num_samples=20000, horizon=TRAJECTORY_HORIZON):
+    """
+    Rollout windows for the trajectory surrogate: initial storage, `horizon` rain values and a
+    first-step action effect -> the next `horizon` storages (effect applied on the first hour only).
+
+    Rain comes from the scenarios' own series (window clamped at the last hour, as in the backend) with
+    the backend's per-hour perturbation. Storage is drawn up to 1.1x the zone's steady state under the
+    wettest perturbed hour, which is about 80 for the typhoon zones.
+    """
+    scenarios = load_params()
+    rain_series = {s["id"]: load_rain(s["csv"]) for s in scenarios}
+    data = []
+
+    for _ in range(num_samples):
+        scenario = random.choice(scenarios)
+        zones = scenario["params"]["zones"]
+        z_params = zones[random.choice(list(zones.keys()))]
+        series = rain_series[scenario["id"]]
+
+        rain_max = max(series) * RAIN_PERTURB[1]
+        storage = random.uniform(0, zone_storage_max(z_params, rain_max))
+        start = random.randrange(len(series))
+        rains = [series[min(start + h, len(series) - 1)] * random.uniform(*RAIN_PERTURB) for h in range(horizon)]
+        if random.random() < PADDED_SHARE:
+            cut = random.randint(1, horizon - 1) if horizon > 1 else horizon
+            rains[cut:] = [0.0] * (horizon - cut)
+
+        # "funding" never changes storage in the game
+        effects = [0.0] + [cfg["effect"] for aid, cfg in scenario["actions"].items() if aid != "funding"]
+        effect = random.choice(effects)
+
+        row = {"current_storage": storage}
+        row.update({f"rain_{h + 1}": r for h, r in enumerate(rains)})
+        row.update({"action_effect": effect, "zone_a": z_params["a"], "zone_b": z_params["b"], "zone_c": z_params["c"]})
+        s = storage
+        for h, rain_now in enumerate(rains):
+            e = effect if h == 0 else 0.0
+            s = max(z_params["a"] * s + z_params["b"] * rain_now - z_params["c"] * e, 0.0)
+            row[f"next_storage_{h + 1}"] = s
+        data.append(row)
+
+    return pd.DataFrame(data)
+
 if __name__ == "__main__":
+    random.seed(0)  # reproducible artifacts
     df = generate_data(20000)
     output_dir = Path("code/model")
     output_dir.mkdir(exist_ok=True)
@@ -67,5 +133,10 @@ if __name__ == "__main__":
     df.to_csv(output_path, index=False)
     print(f"Generated {len(df)} samples and saved to {output_path}")
 
+    traj = generate_trajectory_data(60000)
+    traj_path = output_dir / "trajectory_data.csv"
+    traj.to_csv(traj_path, index=False)
+    print(f"Generated {len(traj)} trajectory samples and saved to {traj_path}")
+
 
 
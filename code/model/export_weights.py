@@ -1,6 +1,14 @@
 import joblib
 import numpy as np
+import pandas as pd
 from pathlib import Path
+from sklearn.model_selection import train_test_split
+
+from data_gen import generate_data
+from train import ensemble_arrays, train_ensemble, trajectory_arrays
+from variants import build_variants
+
+FEATURES = ["current_storage", "rain_now", "action_effect", "zone_a", "zone_b", "zone_c"]
 
 def export():
     model_dir = Path("code/model")
@@ -19,8 +27,28 @@ def export():
         "scaler_scale": scaler.scale_
     }
     
+    # Compact variants need inputs for distillation/evaluation: reuse the training data if present
+    data_path = model_dir / "training_data.csv"
+    df = pd.read_csv(data_path) if data_path.exists() else generate_data(20000)
+    X_train, X_test, _, y_test = train_test_split(df[FEATURES], df["next_storage"], test_size=0.2, random_state=42)
+    X_train_scaled, X_test_scaled = scaler.transform(X_train), scaler.transform(X_test)
+    variants = build_variants(model, scaler, X_train_scaled, X_test_scaled, y_test)
+
+    # Trajectory surrogate (optional artifact from train.py)
+    trajectory = {}
+    if (model_dir / "trajectory_model.pkl").exists():
+        traj_model = joblib.load(model_dir / "trajectory_model.pkl")
+        traj_scaler = joblib.load(model_dir / "trajectory_scaler.pkl")
+        trajectory = trajectory_arrays(traj_model, traj_scaler, traj_model.n_outputs_)
+
+    # Stacked ensemble (artifact from train.py; trained here if missing)
+    if (model_dir / "ensemble_models.pkl").exists():
+        ensemble = ensemble_arrays(joblib.load(model_dir / "ensemble_models.pkl"))
+    else:
+        ensemble = train_ensemble(model_dir, scaler, X_train_scaled, X_test_scaled)
+
     # Save everything into one npz file
-    np.savez(model_dir / "model_weights.npz", **weights, **biases, **scaler_params)
+    np.savez(model_dir / "model_weights.npz", **weights, **biases, **scaler_params, **variants, **trajectory, **ensemble)
     print(f"Exported weights to {model_dir / 'model_weights.npz'}")
 
 if __name__ == "__main__":
@@ -0,0 +1,103 @@
+"""
+Offline solver for the per-scenario policy tables used by the backend with FLOOD_POLICY=1.
+
+Each scenario's rain series is fixed, so the recommendation only depends on (t, zone storages, budget).
+This runs backward induction over a grid of those states: V[T] = 0 and V[t] = min over candidate actions of
+the CVaR (over rain perturbation factors) of stage loss + interpolated V[t+1]. The one-step model is the
+backend's own `policy_q`, so tables use the same surrogate, costs and penalties as the live game.
+Tables are written to code/data/policies/<scenario_id>.npz.
+
+Usage (from the repository root):
+    python code/model/solve_policy.py
+    python code/model/solve_policy.py --storage-points 11 --budget-points 12 --scenario city_commander_basic
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+BACKEND_DIR = Path(__file__).resolve().parents[1] / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from app import main as backend  # noqa: E402
+from app.policy import PolicyTable, scenario_fingerprint  # noqa: E402
+
+ALPHA = 0.8  # CVaR over the worst 20%, as in the Monte Carlo recommender
+
+
+def storage_axis(zp, rain, points):
+    """0 .. a bound above the wettest perturbed steady state b * rain_max / (1 - a) (as for the zone LUTs)."""
+    rain_max = max(rain, default=0.0) * backend.RAIN_PERTURB_HIGH
+    upper = max(zp.b * rain_max / max(1.0 - zp.a, 1e-3), 3.0 * zp.threshold) * 1.1
+    return np.linspace(0.0, upper, points)
+
+
+def budget_axis(spec, rain, points):
+    """From one unaffordable action into debt up to the initial budget plus every grant and one funding."""
+    costs = [cfg.cost for aid, cfg in spec.actions.items() if aid != "funding"]
+    funding = spec.actions["funding"].effect if "funding" in spec.actions else 0.0
+    grants = (len(rain) // 6) * (5.0 + 15.0 * backend.POLICY_TRUST / 100.0)
+    return np.linspace(-max(costs, default=0.0), spec.params.initial_budget + grants + funding, points)
+
+
+def solve(spec, rain, storage_points, budget_points, n_factors):
+    zones = backend.zone_arrays(spec)
+    storage_axes = [storage_axis(spec.params.zones[zid], rain, storage_points) for zid in zones.ids]
+    budgets = budget_axis(spec, rain, budget_points)
+    # Midpoint quadrature of the uniform rain perturbation used by the recommender
+    low, high = backend.RAIN_PERTURB_LOW, backend.RAIN_PERTURB_HIGH
+    factors = low + (high - low) * (np.arange(n_factors) + 0.5) / n_factors
+
+    horizon = len(rain)
+    shape = (horizon + 1,) + tuple(len(a) for a in storage_axes) + (len(budgets),)
+    table = PolicyTable(
+        scenario_id=spec.id,
+        zone_ids=zones.ids,
+        storage_axes=storage_axes,
+        budget_axis=budgets,
+        value=np.zeros(shape),
+        factors=factors,
+        alpha=ALPHA,
+        fingerprint=scenario_fingerprint(spec.model_dump(), rain),
+        meta={
+            "surrogate": backend.SURROGATE.variant if backend.SURROGATE is not None else "formula",
+            "storage_points": storage_points,
+            "budget_points": budget_points,
+            "rain_factors": n_factors,
+            "assumed_trust": backend.POLICY_TRUST,
+        },
+    )
+    grid = np.stack(np.meshgrid(*storage_axes, indexing="ij"), axis=-1).reshape(-1, len(zones.ids))
+    for t in reversed(range(horizon)):
+        q = backend.policy_q(spec, zones, rain, t, grid, budgets, factors, ALPHA, table.value_at)
+        table.value[t] = q.min(axis=0).reshape(shape[1:])
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--storage-points", type=int, default=9, help="grid points per zone storage axis")
+    parser.add_argument("--budget-points", type=int, default=9, help="grid points on the budget axis")
+    parser.add_argument("--rain-factors", type=int, default=8, help="rain perturbation quadrature points")
+    parser.add_argument("--scenario", action="append", default=None, help="only solve these scenario ids")
+    parser.add_argument("--out", type=Path, default=backend.POLICY_DIR)
+    args = parser.parse_args()
+
+    snapshot = backend.SCENARIO_REGISTRY.current()
+    for sid, spec in snapshot.scenarios.items():
+        if args.scenario and sid not in args.scenario:
+            continue
+        rain = snapshot.rainfall[sid]
+        t0 = time.perf_counter()
+        table = solve(spec, rain, args.storage_points, args.budget_points, args.rain_factors)
+        path = args.out / f"{sid}.npz"
+        table.save(path)
+        start = table.value_at(0, np.zeros(len(table.zone_ids)), np.array(spec.params.initial_budget))
+        print(f"{sid}: grid {table.value.shape[1:]}, {len(rain)} steps, V0={float(start):.2f}, "
+              f"{time.perf_counter() - t0:.1f}s -> {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,108 @@ from sklearn.preprocessing import StandardScaler
 import joblib
 from pathlib import Path
 
+from variants import build_variants, widen_storage
+
+def trajectory_arrays(model, scaler, horizon):
+    """npz arrays for the trajectory surrogate (`traj__*`, own scaler since it has horizon + 5 inputs)."""
+    arrays = {f"traj__w_{i}": w for i, w in enumerate(model.coefs_)}
+    arrays.update({f"traj__b_{i}": b for i, b in enumerate(model.intercepts_)})
+    arrays.update({
+        "traj__scaler_mean": scaler.mean_,
+        "traj__scaler_scale": scaler.scale_,
+        "traj__horizon": np.array(horizon),
+    })
+    return arrays
+
+# Stacked ensemble for epistemic uncertainty: members share one architecture so weights stack into 3-D tensors
+ENSEMBLE_MEMBERS = 5
+ENSEMBLE_HIDDEN = (32, 16)
+
+def ensemble_arrays(members):
+    """npz arrays for the stacked ensemble: `ens__w_i` (N, in, out) and `ens__b_i` (N, out)."""
+    arrays = {}
+    for i in range(len(members[0].coefs_)):
+        arrays[f"ens__w_{i}"] = np.stack([m.coefs_[i] for m in members])
+        arrays[f"ens__b_{i}"] = np.stack([m.intercepts_[i] for m in members])
+    return arrays
+
+def formula_targets(scaler, X_scaled):
+    """Ground-truth next storages of scaled one-step inputs (the game's transition, clamped at zero)."""
+    s, rain, effect, a, b, c = scaler.inverse_transform(X_scaled).T
+    return np.maximum(a * s + b * rain - c * effect, 0.0)
+
+def train_ensemble(model_dir, scaler, X_train_scaled, X_test_scaled):
+    """
+    Train ENSEMBLE_MEMBERS bootstrap members (shared scaler); returns their stacked npz arrays.
+
+    The forecast runs them over every storage it serves (up to ~80 in the typhoon zones), so like the compact
+    variants they are fitted over storages widened to SERVING_STORAGE_MAX, with the formula's targets.
+    """
+    X_train_scaled = widen_storage(X_train_scaled, scaler, seed=2)
+    X_test_scaled = widen_storage(X_test_scaled, scaler, seed=3)
+    y_train = formula_targets(scaler, X_train_scaled)
+    y_test = formula_targets(scaler, X_test_scaled)
+    rng = np.random.default_rng(42)
+    members = []
+    print(f"Training {ENSEMBLE_MEMBERS}-member surrogate ensemble...")
+    for k in range(ENSEMBLE_MEMBERS):
+        idx = rng.integers(0, len(X_train_scaled), size=len(X_train_scaled))
+        member = MLPRegressor(hidden_layer_sizes=ENSEMBLE_HIDDEN, activation='relu', solver='adam', max_iter=500, random_state=100 + k)
+        member.fit(X_train_scaled[idx], y_train[idx])
+        members.append(member)
+    preds = np.stack([m.predict(X_test_scaled) for m in members])
+    print(f"Ensemble member R^2: {[round(m.score(X_test_scaled, y_test), 4) for m in members]}, mean spread {preds.std(axis=0).mean():.4f}")
+    joblib.dump(members, model_dir / "ensemble_models.pkl")
+    return ensemble_arrays(members)
+
+def chained_targets(model, scaler, X, horizon):
+    """Storages from chaining the one-step model over each window (effect on the first hour only), clamped as served."""
+    s = X["current_storage"].to_numpy()
+    out = []
+    for h in range(horizon):
+        effect = X["action_effect"].to_numpy() if h == 0 else np.zeros(len(X))
+        step = pd.DataFrame({
+            "current_storage": s, "rain_now": X[f"rain_{h + 1}"].to_numpy(), "action_effect": effect,
+            "zone_a": X["zone_a"].to_numpy(), "zone_b": X["zone_b"].to_numpy(), "zone_c": X["zone_c"].to_numpy(),
+        })
+        s = np.maximum(model.predict(scaler.transform(step)), 0.0)
+        out.append(s)
+    return np.column_stack(out)
+
+def train_trajectory_model(model_dir, one_step, one_step_scaler):
+    """
+    Train the multi-step trajectory surrogate; returns its npz arrays (empty if no data).
+
+    It replaces chained one-step calls in the backend's rollouts, so it is fitted to the one-step model's
+    chained outputs over the generated windows rather than to the formula targets.
+    """
+    data_path = model_dir / "trajectory_data.csv"
+    if not data_path.exists():
+        print("Trajectory data not found. Run data_gen.py first; skipping trajectory surrogate.")
+        return {}
+
+    df = pd.read_csv(data_path)
+    horizon = len([col for col in df.columns if col.startswith("next_storage_")])
+    X = df[["current_storage"] + [f"rain_{h + 1}" for h in range(horizon)] + ["action_effect", "zone_a", "zone_b", "zone_c"]]
+    y = chained_targets(one_step, one_step_scaler, X, horizon)
+
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    scaler = StandardScaler()
+    X_train_scaled = scaler.fit_transform(X_train)
+    X_test_scaled = scaler.transform(X_test)
+
+    print(f"Training {horizon}-step trajectory surrogate...")
+    model = MLPRegressor(
+        hidden_layer_sizes=(64, 32), activation='relu', solver='adam',
+        max_iter=2000, tol=1e-7, n_iter_no_change=30, random_state=42,
+    )
+    model.fit(X_train_scaled, y_train)
+    print(f"Trajectory R^2 Score: {model.score(X_test_scaled, y_test):.4f}")
+
+    joblib.dump(model, model_dir / "trajectory_model.pkl")
+    joblib.dump(scaler, model_dir / "trajectory_scaler.pkl")
+    return trajectory_arrays(model, scaler, horizon)
+
 def train_model():
     data_path = Path("code/model/training_data.csv")
     if not data_path.exists():
@@ -48,7 +150,11 @@ def train_model():
     weights = {f"w_{i}": w for i, w in enumerate(model.coefs_)}
     biases = {f"b_{i}": b for i, b in enumerate(model.intercepts_)}
     scaler_params = {"scaler_mean": scaler.mean_, "scaler_scale": scaler.scale_}
-    np.savez(model_dir / "model_weights.npz", **weights, **biases, **scaler_params)
+    # Compact variants (distilled / pruned / int8), selectable via FLOOD_SURROGATE_VARIANT
+    variants = build_variants(model, scaler, X_train_scaled, X_test_scaled, y_test)
+    trajectory = train_trajectory_model(model_dir, model, scaler)
+    ensemble = train_ensemble(model_dir, scaler, X_train_scaled, X_test_scaled)
+    np.savez(model_dir / "model_weights.npz", **weights, **biases, **scaler_params, **variants, **trajectory, **ensemble)
     print(f"Model weights exported to {model_dir / 'model_weights.npz'}")
 
 if __name__ == "__main__":
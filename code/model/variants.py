@@ -0,0 +1,216 @@
+"""
+Compact surrogate variants exported next to the full (64, 32) MLP in `model_weights.npz`.
+
+- distilled: a (32,) MLP trained on the full model's predictions (cheaper per inference)
+- pruned:    the full model pruned gradually with masked fine-tuning, dead neurons removed (cheaper per inference)
+- int8:      the full model with per-output-column symmetric int8 weights. They are dequantized at load, so
+             this variant shrinks the artifact but not the matmul cost.
+
+Each variant is stored under `<variant>__w_i` / `<variant>__b_i` (int8 adds `<variant>__s_i` scales)
+plus a `<variant>__meta` JSON string. All variants share the top-level `scaler_mean`/`scaler_scale`.
+A variant is only exported if, in every scenario zone, it stays within the error budget of the full model
+over the storages, rain and action effects that zone sees in play.
+"""
+import copy
+import json
+
+import numpy as np
+from sklearn.neural_network import MLPRegressor
+
+from data_gen import RAIN_PERTURB, load_params, load_rain, zone_storage_max
+
+# Accuracy budget, per scenario zone: |variant - full model| (outputs clamped at zero, as served) must stay
+# within ERROR_BUDGET x max(|full model|, zone threshold) at every one of CHECK_POINTS inputs drawn over the
+# zone's range in play, the same relative measure as the backend's LUT and trajectory checks. A flat
+# absolute budget is loose for the small zones, whose thresholds are 1.2-2.5 storage units.
+ERROR_BUDGET = 0.02
+CHECK_POINTS = 4096
+
+# The training data only covers storages in [0, 5], but typhoon zones reach ~80 in play. Variants are fitted
+# and evaluated on the teacher's outputs over this whole range (teacher labels need no ground truth).
+SERVING_STORAGE_MAX = 100.0
+
+DISTILLED_HIDDEN = (32,)
+# Gradual pruning schedule; each stage fine-tunes the surviving weights for PRUNE_EPOCHS passes
+PRUNE_SPARSITIES = (0.5, 0.6, 0.7, 0.8, 0.9)
+PRUNE_EPOCHS = 50
+PRUNE_LEARNING_RATE = 3e-4
+
+
+def forward(coefs, intercepts, x):
+    """Plain numpy forward pass matching MLPRegressor (relu hidden layers, identity output)."""
+    h = x
+    for i, (w, b) in enumerate(zip(coefs, intercepts)):
+        h = h @ w + b
+        if i < len(coefs) - 1:
+            h = np.maximum(h, 0.0)
+    return np.maximum(h.reshape(-1), 0.0)
+
+
+def distill(model, X_scaled, hidden=DISTILLED_HIDDEN, seed=42):
+    """Train a narrow student on the teacher's predictions over the same inputs."""
+    student = MLPRegressor(
+        hidden_layer_sizes=hidden, activation="relu", solver="adam",
+        max_iter=2000, tol=1e-7, n_iter_no_change=50, random_state=seed,
+    )
+    student.fit(X_scaled, model.predict(X_scaled))
+    return [w.copy() for w in student.coefs_], [b.copy() for b in student.intercepts_]
+
+
+def compact(coefs, intercepts):
+    """
+    Remove hidden neurons made dead by pruning. A neuron with no outgoing weights is dropped; a neuron
+    with no incoming weights outputs the constant relu(bias), which is folded into the next layer's bias.
+    """
+    coefs = [w.copy() for w in coefs]
+    intercepts = [b.copy() for b in intercepts]
+    for i in range(len(coefs) - 1):
+        no_out = ~np.any(coefs[i + 1] != 0, axis=1)
+        no_in = ~np.any(coefs[i] != 0, axis=0)
+        const = no_in & ~no_out
+        intercepts[i + 1] = intercepts[i + 1] + np.maximum(intercepts[i][const], 0.0) @ coefs[i + 1][const]
+        keep = ~(no_out | no_in)
+        if not keep.any():
+            keep[np.argmax(np.abs(intercepts[i]))] = True
+        coefs[i] = coefs[i][:, keep]
+        intercepts[i] = intercepts[i][keep]
+        coefs[i + 1] = coefs[i + 1][keep, :]
+    return coefs, intercepts
+
+
+def prune_masks(coefs, sparsity):
+    """Per-layer magnitude masks keeping the largest (1 - `sparsity`) fraction of |w| in each hidden layer."""
+    masks = [np.abs(w) > np.quantile(np.abs(w), sparsity) for w in coefs[:-1]]
+    return masks + [np.ones(coefs[-1].shape, dtype=bool)]  # the output layer is tiny; pruning it kills neurons
+
+
+def prune(model, X_scaled, sparsities=PRUNE_SPARSITIES, epochs=PRUNE_EPOCHS):
+    """
+    Gradual magnitude pruning with fine-tuning: at each sparsity, zero the smallest weights of a copy of
+    `model`, then retrain it on the teacher's predictions with the pruned weights held at zero.
+    Yields (sparsity, coefs, intercepts) for each stage, compacted.
+    """
+    targets = model.predict(X_scaled)
+    student = copy.deepcopy(model)
+    student.set_params(learning_rate_init=PRUNE_LEARNING_RATE)
+    for sparsity in sparsities:
+        masks = prune_masks(student.coefs_, sparsity)
+        student.coefs_ = [w * m for w, m in zip(student.coefs_, masks)]
+        # Fresh Adam state per stage: the copied optimizer would keep the teacher's learning rate and moments
+        student.__dict__.pop("_optimizer", None)
+        for _ in range(epochs):
+            student.partial_fit(X_scaled, targets)
+            student.coefs_ = [w * m for w, m in zip(student.coefs_, masks)]
+        yield (sparsity, *compact(student.coefs_, student.intercepts_))
+
+
+def quantize_int8(coefs):
+    """Symmetric per-output-column int8 quantization. Returns (q_weights, scales)."""
+    qs, scales = [], []
+    for w in coefs:
+        scale = np.max(np.abs(w), axis=0) / 127.0
+        scale = np.where(scale > 0, scale, 1.0).astype(np.float32)
+        qs.append(np.clip(np.round(w / scale), -127, 127).astype(np.int8))
+        scales.append(scale)
+    return qs, scales
+
+
+def widen_storage(X_scaled, scaler, seed):
+    """`X_scaled` plus a copy with storage redrawn uniformly over [0, SERVING_STORAGE_MAX]."""
+    rng = np.random.default_rng(seed)
+    wide = np.array(X_scaled, dtype=np.float64)
+    wide[:, 0] = (rng.uniform(0.0, SERVING_STORAGE_MAX, len(wide)) - scaler.mean_[0]) / scaler.scale_[0]
+    return np.vstack([X_scaled, wide])
+
+
+def scenario_inputs(scaler, n_points, seed):
+    """
+    Scaled inputs per scenario zone, {"<scenario>/<zone>": (X_scaled, threshold)}: storage over
+    [0, zone_storage_max], rain up to the wettest perturbed hour and the scenario's action effects.
+    """
+    rng = np.random.default_rng(seed)
+    out = {}
+    for scenario in load_params():
+        rain_max = max(load_rain(scenario["csv"])) * RAIN_PERTURB[1]
+        effects = np.array([0.0] + [cfg["effect"] for aid, cfg in scenario["actions"].items() if aid != "funding"])
+        for zone_id, z in scenario["params"]["zones"].items():
+            X = np.column_stack([
+                rng.uniform(0.0, zone_storage_max(z, rain_max), n_points),
+                rng.uniform(0.0, rain_max, n_points),
+                effects[rng.integers(0, len(effects), n_points)],
+                np.full(n_points, z["a"]), np.full(n_points, z["b"]), np.full(n_points, z["c"]),
+            ])
+            out[f"{scenario['id']}/{zone_id}"] = ((X - scaler.mean_) / scaler.scale_, float(z["threshold"]))
+    return out
+
+
+def zone_errors(coefs, intercepts, full_preds, check):
+    """Max |variant - full| / max(|full|, threshold) per zone of `check` (see scenario_inputs)."""
+    errors = {}
+    for label, (X, threshold) in check.items():
+        pred, full = forward(coefs, intercepts, X), full_preds[label]
+        errors[label] = float(np.max(np.abs(pred - full) / np.maximum(np.abs(full), threshold)))
+    return errors
+
+
+def _meta(name, coefs, intercepts, full_preds, check, X_test, y, extra=None):
+    errors = zone_errors(coefs, intercepts, full_preds, check)
+    max_abs = max(float(np.max(np.abs(forward(coefs, intercepts, X) - full_preds[label]))) for label, (X, _) in check.items())
+    meta = {
+        "variant": name,
+        "hidden": [int(w.shape[1]) for w in coefs[:-1]],
+        "nonzero_weights": int(sum(np.count_nonzero(w) for w in coefs)),
+        "rmse": float(np.sqrt(np.mean((forward(coefs, intercepts, X_test) - y) ** 2))),
+        "max_abs_err_vs_full": max_abs,
+        "err_vs_full": max(errors.values()),
+        "error_budget": ERROR_BUDGET,
+        "zone_errors": errors,
+    }
+    meta.update(extra or {})
+    return meta
+
+
+def build_variants(model, scaler, X_train_scaled, X_test_scaled, y_test):
+    """Build all compact variants; returns npz arrays for those within the error budget in every zone."""
+    y_test = np.asarray(y_test, dtype=np.float64)
+    X_train_scaled = widen_storage(X_train_scaled, scaler, seed=0)
+    check = scenario_inputs(scaler, CHECK_POINTS, seed=1)
+    full_preds = {label: np.maximum(model.predict(X), 0.0) for label, (X, _) in check.items()}
+    print(f"Building compact surrogate variants (relative error budget {ERROR_BUDGET} in {len(check)} zones)...")
+    arrays = {}
+
+    def add(name, coefs, intercepts, meta, scales=None):
+        worst = max(meta["zone_errors"], key=meta["zone_errors"].get)
+        print(f"  {name}: hidden={meta['hidden']} rel err vs full={meta['err_vs_full']:.4f} ({worst}) "
+              f"max abs={meta['max_abs_err_vs_full']:.4f} rmse={meta['rmse']:.4f}")
+        if meta["err_vs_full"] > ERROR_BUDGET:
+            print(f"  {name}: exceeds error budget {ERROR_BUDGET}, not exported")
+            return
+        for i, (w, b) in enumerate(zip(coefs, intercepts)):
+            arrays[f"{name}__w_{i}"] = w
+            arrays[f"{name}__b_{i}"] = b
+            if scales is not None:
+                arrays[f"{name}__s_{i}"] = scales[i]
+        arrays[f"{name}__meta"] = np.array(json.dumps(meta))
+
+    coefs, intercepts = distill(model, X_train_scaled)
+    add("distilled", coefs, intercepts, _meta("distilled", coefs, intercepts, full_preds, check, X_test_scaled, y_test))
+
+    # Keep the last stage within budget (the first stage if none is); later stages only prune further
+    best = None
+    for sparsity, coefs, intercepts in prune(model, X_train_scaled):
+        within = max(zone_errors(coefs, intercepts, full_preds, check).values()) <= ERROR_BUDGET
+        if best is None or within:
+            best = sparsity, coefs, intercepts
+        if not within:
+            break
+    sparsity, coefs, intercepts = best
+    add("pruned", coefs, intercepts, _meta(
+        "pruned", coefs, intercepts, full_preds, check, X_test_scaled, y_test, {"sparsity": sparsity}
+    ))
+
+    qs, scales = quantize_int8(model.coefs_)
+    deq = [q.astype(np.float64) * s for q, s in zip(qs, scales)]
+    intercepts = [b.astype(np.float32) for b in model.intercepts_]
+    add("int8", qs, intercepts, _meta("int8", deq, intercepts, full_preds, check, X_test_scaled, y_test), scales=scales)
+    return arrays